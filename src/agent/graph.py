@@ -4,24 +4,85 @@ Retrieval Graph.
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import cast, Literal, Any
+import time
+import logging
+from typing import cast, Literal, Any, Optional
 
 # Add the project root to sys.path for relative imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
 # Import all modules after setting up sys.path
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.documents import Document
-from langchain_core.messages import BaseMessage, AIMessage, HumanMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    BaseMessage,
+    AIMessage,
+    AIMessageChunk,
+    HumanMessage,
+    message_chunk_to_message,
+)
 from langgraph.graph import END, START, StateGraph
-from src.utils import format_docs, load_chat_model
+from langgraph.config import get_stream_writer
+from langgraph.types import Command, Send
+from src.utils import dedup_docs, format_docs, load_chat_model, load_structured_chat_model
 from src.configuration import Configuration
-from src.vectorstore import get_collection_list
+from src.vectorstore import get_collection_list, get_vector_store_registry
+from src.rerank import get_reranker, select_within_budget
+from src.response_cache import CachedResponse, lookup_response, store_response
 from src.agent.state import AgentState, RouterState, Plan, InputState
 from src.agent.researcher.graph import graph as researcher_graph
 from src.agent.researcher.state import ResearcherState
 
 
+logger = logging.getLogger(__name__)
+
+
+def get_standalone_question(state: AgentState) -> Optional[str]:
+    """Get the question of a conversation with a single human turn, None otherwise.
+
+    A follow-up question depends on the previous turns, so it is neither answered from
+    nor stored in the response cache.
+    """
+    questions = [message for message in state.messages if message.type == "human"]
+    if len(questions) != 1 or not isinstance(questions[0].content, str):
+        return None
+    return questions[0].content
+
+
+async def check_response_cache(
+    state: AgentState, config: RunnableConfig
+) -> Command[Literal["analyze_and_route_query", "respond_from_cache"]]:
+    """Answer from the semantic response cache if a near-duplicate question was answered."""
+    configuration = Configuration.model_validate(config.get("configurable"))
+    question = get_standalone_question(state)
+    if not configuration.response_cache_enabled or not question:
+        return Command(goto="analyze_and_route_query")
+
+    executor = get_vector_store_registry().get_executor(
+        configuration.max_concurrent_retrievals
+    )
+    cached = await run_in_executor(executor, lookup_response, question, configuration)
+    if cached is None:
+        return Command(goto="analyze_and_route_query")
+    return Command(
+        update={"documents": "delete"},
+        goto=Send("respond_from_cache", cached),
+    )
+
+
+async def respond_from_cache(
+    state: CachedResponse,
+) -> dict[str, list[BaseMessage] | list[Document] | list[str] | str]:
+    """Respond with a cached answer and restore the documents it was generated from."""
+    return {
+        "messages": [AIMessage(content=state.answer)],
+        "answer": state.answer,
+        "documents": state.documents,
+        "collections": state.collections,
+        "question": state.question,
+    }
 
 
 async def analyze_and_route_query(
@@ -31,11 +92,7 @@ async def analyze_and_route_query(
     if state.type and state.logic:  # for testing
         return {"type": state.type, "logic": state.logic}
     configuration = Configuration.model_validate(config.get("configurable"))
-    structured_output_kwargs = (
-        {"method": "function_calling"} if "openai" in configuration.query_model else {}
-    )
-    llm, _, _ = load_chat_model(configuration.query_model)
-    model = llm.with_structured_output(RouterState, include_raw=False, **structured_output_kwargs)
+    model = load_structured_chat_model(configuration.query_model, RouterState)
     messages = [
         {
             "role": "system",
@@ -120,11 +177,7 @@ async def create_research_plan(
     """
 
     configuration = Configuration.model_validate(config.get("configurable"))
-    structured_output_kwargs = (
-        {"method": "function_calling"} if "openai" in configuration.query_model else {}
-    )
-    model, _, _ = load_chat_model(configuration.query_model)
-    model = model.with_structured_output(Plan, include_raw=False, **structured_output_kwargs)
+    model = load_structured_chat_model(configuration.query_model, Plan)
     messages = [
         {"role": "system", "content": configuration.research_plan_system_prompt}
     ] + state.messages
@@ -164,21 +217,120 @@ def check_finished(state: AgentState) -> Literal["respond", "conduct_research"]:
         return "respond"  # 为空说明执行完毕
 
 
+def route_research(
+    state: AgentState, config: RunnableConfig
+) -> Literal["respond", "conduct_research"] | list[Send]:
+    """Dispatch the remaining research steps, one by one or concurrently."""
+    if not state.steps:
+        return "respond"
+    configuration = Configuration.model_validate(config.get("configurable"))
+    if configuration.research_mode == "sequential":
+        return "conduct_research"
+    return [
+        Send(
+            "conduct_research_step",
+            ResearcherState(step=step, collections=state.collections or []),
+        )
+        for step in state.steps[: configuration.max_parallel_steps]
+    ]
+
+
+async def conduct_research_step(
+    state: ResearcherState,
+) -> dict[str, list[Document]]:
+    """Conduct research for a single step dispatched in parallel mode."""
+    step_result = await researcher_graph.ainvoke(state)
+    return {"documents": step_result["documents"]}
+
+
+async def collect_research(
+    state: AgentState, config: RunnableConfig
+) -> dict[str, list[str]]:
+    """Remove the steps researched by the last parallel batch."""
+    configuration = Configuration.model_validate(config.get("configurable"))
+    return {"steps": state.steps[configuration.max_parallel_steps :]}
+
+
+async def stream_response(
+    model: BaseChatModel, messages: list, provider: str
+) -> tuple[BaseMessage, dict[str, float]]:
+    """Stream a response, so the tokens surface in the graph's `messages` stream mode.
+
+    Returns:
+        tuple[BaseMessage, dict[str, float]]: The full response and its latency metrics.
+    """
+    # openai only reports the token usage of a stream when asked to
+    stream_kwargs = {"stream_usage": True} if provider == "openai" else {}
+    start = time.perf_counter()
+    first_token_at = None
+    chunk_count = 0
+    response: AIMessageChunk | None = None
+    async for chunk in model.astream(messages, **stream_kwargs):
+        if chunk.content:
+            chunk_count += 1
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+        response = chunk if response is None else response + chunk  # type: ignore
+    end = time.perf_counter()
+
+    if response is None:
+        response = AIMessageChunk(content="")
+    usage = response.usage_metadata or {}
+    output_tokens = usage.get("output_tokens") or chunk_count
+    generation_time = end - (first_token_at or start)
+    metrics = {
+        "time_to_first_token": (first_token_at or end) - start,
+        "total_time": end - start,
+        "output_tokens": output_tokens,
+        "tokens_per_second": output_tokens / generation_time if generation_time > 0 else 0.0,
+    }
+    return message_chunk_to_message(response), metrics
+
+
 async def respond(
     state: AgentState, config: RunnableConfig
 ) -> dict[str, list[BaseMessage] | str | Any]:
     """Respond to the retrieved documents and the user's question."""
     configuration = Configuration.model_validate(config.get("configurable"))
-    model, _, _ = load_chat_model(configuration.response_model)
-    # add a re-ranker here, todo
-    top_k = 20
-    context = format_docs(state.documents[:top_k])
+    model, provider, _ = load_chat_model(configuration.response_model)
+    reranker = get_reranker(configuration.reranker)
+    query = state.question or str(state.messages[-1].content)
+    documents = select_within_budget(
+        reranker(query, dedup_docs(state.documents)), configuration.context_token_budget
+    )
+    context = format_docs(documents)
     prompt = configuration.response_system_prompt.format(
         collections=state.collections, context=context
     )
     messages = [{"role": "system", "content": prompt}] + state.messages
-    response = await model.ainvoke(messages)
-    return {"messages": [response], "answer": response.content}
+    if not configuration.stream_response:
+        response = await model.ainvoke(messages)
+        return {"messages": [response], "answer": response.content}
+
+    response, metrics = await stream_response(model, messages, provider)
+    logger.info("Response metrics: %s", metrics)
+    get_stream_writer()({"response_metrics": metrics})
+    return {"messages": [response], "answer": response.content, "response_metrics": metrics}
+
+
+async def update_response_cache(state: AgentState, config: RunnableConfig) -> dict:
+    """Store the answer in the semantic response cache."""
+    configuration = Configuration.model_validate(config.get("configurable"))
+    if not configuration.response_cache_enabled or not state.answer or not state.documents:
+        return {}
+    if get_standalone_question(state) is None:
+        return {}
+    response = CachedResponse(
+        question=state.question,
+        answer=state.answer,
+        documents=state.documents,
+        collections=state.collections or [],
+    )
+    executor = get_vector_store_registry().get_executor(
+        configuration.max_concurrent_retrievals
+    )
+    await run_in_executor(executor, store_response, response, configuration)
+    return {}
 
 
 builder = StateGraph(
@@ -186,23 +338,40 @@ builder = StateGraph(
     input_schema=InputState,
     context_schema=Configuration,
 )
+builder.add_node(check_response_cache)
+builder.add_node(respond_from_cache)
 builder.add_node(analyze_and_route_query)
 builder.add_node(ask_for_more_info)
 builder.add_node(respond_to_unrelated_query)
 builder.add_node(respond_to_general_query)
 builder.add_node(create_research_plan)
 builder.add_node(conduct_research)
+builder.add_node(conduct_research_step)
+builder.add_node(collect_research)
 builder.add_node(respond)
+builder.add_node(update_response_cache)
 
 
-builder.add_edge(START, "analyze_and_route_query")
+builder.add_edge(START, "check_response_cache")
+builder.add_edge("respond_from_cache", END)
 builder.add_conditional_edges("analyze_and_route_query", path=route_query)
 builder.add_edge("respond_to_general_query", END)
 builder.add_edge("respond_to_unrelated_query", END)
 builder.add_edge("ask_for_more_info", "analyze_and_route_query")
-builder.add_edge("create_research_plan", "conduct_research")
+builder.add_conditional_edges(
+    "create_research_plan",
+    route_research,
+    path_map=["respond", "conduct_research", "conduct_research_step"],
+)
 builder.add_conditional_edges("conduct_research", check_finished)
-builder.add_edge("respond", END)
+builder.add_edge("conduct_research_step", "collect_research")
+builder.add_conditional_edges(
+    "collect_research",
+    route_research,
+    path_map=["respond", "conduct_research", "conduct_research_step"],
+)
+builder.add_edge("respond", "update_response_cache")
+builder.add_edge("update_response_cache", END)
 
 # Compile into a graph object that you can invoke and deploy.
 graph = builder.compile()
@@ -9,6 +9,7 @@ from langgraph.graph import END, START, StateGraph
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
 from src.agent.researcher.tools.queries import generate_queries
 from src.agent.researcher.tools.retriever import (
+    embed_queries,
     retrieve_documents,
     retrieve_in_parallel,
 )
@@ -19,9 +20,11 @@ from src.agent.researcher.state import ResearcherState
 builder = StateGraph(ResearcherState)
 builder.add_node(generate_queries)
 builder.add_edge(START, "generate_queries")
+builder.add_node(embed_queries)
+builder.add_edge("generate_queries", "embed_queries")
 builder.add_node(retrieve_documents) # type: ignore
 builder.add_conditional_edges(
-    "generate_queries",
+    "embed_queries",
     retrieve_in_parallel,  # type: ignore
     path_map=["retrieve_documents"],
 )
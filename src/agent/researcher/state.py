@@ -2,7 +2,7 @@
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 from pydantic import BaseModel, Field
 from langchain_core.documents import Document
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
@@ -16,6 +16,23 @@ class QueryState(BaseModel):
     collections: list[str] = Field(
         description="The list of collection to search in, at most 2 collections."
     )
+    doc_type: Optional[Literal["doc", "ref", "code"]] = Field(
+        default=None,
+        description=(
+            "The kind of pages to search, only set when the query clearly targets one: "
+            "`doc` for guides and tutorials, `ref` for the API reference of a class or "
+            "function, `code` for its source code. Leave it empty to search all pages."
+        ),
+    )
+
+
+class EmbeddedQueryState(QueryState):
+    """Query state sent to the retrieve_documents node, with the query embedding if available."""
+
+    embedding: Optional[list[float]] = Field(
+        default=None,
+        description="The embedding of the query, computed once for the whole research step.",
+    )
 
 
 class GeneratedQueries(BaseModel):
@@ -46,6 +63,10 @@ class ResearcherState(BaseModel):
             "generated by the generate queries tool based on a single research step."
         )
     )
+    query_embeddings: list[list[float]] = Field(
+        default_factory=list,
+        description="The embeddings of the queries, in the same order as the queries.",
+    )
     documents: Annotated[list[Document], reduce_docs] = Field(
         default_factory=list,
         description=(
@@ -11,7 +11,7 @@ sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../"))
 )
 
-from src.utils import load_chat_model
+from src.utils import load_structured_chat_model
 from src.configuration import Configuration
 from src.agent.researcher.state import GeneratedQueries, ResearcherState
 
@@ -24,11 +24,7 @@ async def generate_queries(
     configuration = Configuration.model_validate(
         config.get("configurable")
     )
-    structured_output_kwargs = (
-        {"method": "function_calling"} if "openai" in configuration.query_model else {}
-    )
-    model, _, _ = load_chat_model(configuration.query_model)
-    model = model.with_structured_output(GeneratedQueries, include_raw=False, **structured_output_kwargs)
+    model = load_structured_chat_model(configuration.query_model, GeneratedQueries)
 
     system_prompt = configuration.generate_queries_system_prompt.format(
         collections=state.collections
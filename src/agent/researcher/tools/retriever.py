@@ -4,57 +4,199 @@ Retriever tools for the researcher.
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import Iterator, cast
-from contextlib import contextmanager
+import asyncio
+from typing import Any
 from langchain_core.documents import Document
-from langchain_core.retrievers import BaseRetriever
+from langchain_core.embeddings import Embeddings
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
+from langchain_chroma import Chroma
 from langgraph.types import Send
 
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../"))
 )
-from src.embeddings import get_embeddings_model
-from src.vectorstore import get_vector_store
+from src.docstore import get_parent_store
+from src.lexical import load_lexical_index, reciprocal_rank_fusion
+from src.utils import count_tokens, dedup_docs
+from src.vectorstore import get_vector_store_registry
 from src.configuration import RetrieverConfig
-from src.agent.researcher.state import QueryState, ResearcherState
+from src.agent.researcher.state import EmbeddedQueryState, QueryState, ResearcherState
 
 
-@contextmanager
-def make_retriever(
-    collection_name: str,
-    config: RunnableConfig,
-) -> Iterator[BaseRetriever]:
-    """Create a retriever for the agent, based on the current configuration."""
-    configuration = RetrieverConfig.model_validate(config.get("configurable"))
-    store = get_vector_store(
+def get_vector_store(collection_name: str, configuration: RetrieverConfig) -> Chroma:
+    """Get the pooled vector store of a collection, based on the current configuration."""
+    return get_vector_store_registry().get_vector_store(
         configuration.retriever_provider,
         configuration.storage_type,
         collection_name=collection_name,
-        embedding=get_embeddings_model(configuration.embedding_model),
+        embedding_model=configuration.embedding_model,
+        **configuration.embedding_kwargs(),
     )
-    search_kwargs = configuration.search_kwargs
-    yield store.as_retriever(search_kwargs=search_kwargs)
+
+
+def get_embeddings(configuration: RetrieverConfig) -> Embeddings:
+    """Get the pooled embeddings model shared with the vector stores."""
+    return get_vector_store_registry().get_embeddings(
+        configuration.embedding_model, **configuration.embedding_kwargs()
+    )
+
+
+def get_search_kwargs(state: QueryState, configuration: RetrieverConfig) -> dict[str, Any]:
+    """Get the search kwargs of a query, its `doc_type` is added to the configured filter."""
+    if state.doc_type is None:
+        return configuration.search_kwargs
+    where: dict[str, Any] = {"doc_type": state.doc_type}
+    configured = configuration.search_kwargs.get("filter")
+    if configured:
+        where = {"$and": [configured, where]}
+    return {**configuration.search_kwargs, "filter": where}
+
+
+async def embed_queries(
+    state: ResearcherState, config: RunnableConfig
+) -> dict[str, list[list[float]]]:
+    """Embed all the generated queries of a research step in a single batch."""
+    if not state.queries:
+        return {"query_embeddings": []}
+    configuration = RetrieverConfig.model_validate(config.get("configurable"))
+    embedding = get_embeddings(configuration)
+    vectors = await embedding.aembed_documents([query.query for query in state.queries])
+    return {"query_embeddings": vectors}
 
 
 async def retrieve_documents(
-    state: QueryState, config: RunnableConfig
+    state: EmbeddedQueryState, config: RunnableConfig
 ) -> dict[str, list[Document]]:
-    """Retrieve documents based on a given query."""
-    documents = []
-    for collection_name in state.collections:
-        with make_retriever(collection_name, config) as retriever:
-            response = await retriever.ainvoke(state.query, config)
-            documents.extend(response)
-    return {"documents": documents}
+    """Retrieve documents based on a given query.
+
+    The vector db backend is synchronous, so every search runs in a bounded thread pool
+    and the collections are searched concurrently without blocking the event loop.
+    When the query embedding was computed upstream, it is reused for every collection.
+    The `doc_type` of the query filters the search, the whole collection is searched when
+    no page of that type matches.
+    In hybrid mode the vector results are fused with the collection's lexical index, and the
+    chunks indexed with parent documents are replaced by their parent section.
+    The search distance is kept in the `distance` metadata to deduplicate the results.
+    """
+    configuration = RetrieverConfig.model_validate(config.get("configurable"))
+    executor = get_vector_store_registry().get_executor(
+        configuration.max_concurrent_retrievals
+    )
+
+    async def vector_search(store: Chroma, search_kwargs: dict[str, Any]):
+        if state.embedding is not None:
+            return await run_in_executor(
+                executor,
+                store.similarity_search_by_vector_with_relevance_scores,
+                state.embedding,
+                **search_kwargs,
+            )
+        return await run_in_executor(
+            executor, store.similarity_search_with_score, state.query, **search_kwargs
+        )
+
+    async def search(collection_name: str) -> list[Document]:
+        store = get_vector_store(collection_name, configuration)
+        search_kwargs = get_search_kwargs(state, configuration)
+        results = await vector_search(store, search_kwargs)
+        if not results and search_kwargs is not configuration.search_kwargs:
+            search_kwargs = configuration.search_kwargs
+            results = await vector_search(store, search_kwargs)
+        documents = []
+        for doc, distance in results:
+            doc.metadata["distance"] = distance
+            documents.append(doc)
+        if configuration.retrieval_mode == "hybrid":
+            documents = await run_in_executor(
+                executor, fuse_lexical, store, collection_name, state.query, documents,
+                search_kwargs, configuration,
+            )
+        if configuration.parent_retrieval:
+            documents = await run_in_executor(
+                executor, expand_parents, collection_name, documents, configuration
+            )
+        return documents
+
+    responses = await asyncio.gather(
+        *(search(collection_name) for collection_name in state.collections)
+    )
+    documents = [doc for response in responses for doc in response]
+    return {"documents": dedup_docs(documents)}
+
+
+def fuse_lexical(
+    store: Chroma,
+    collection_name: str,
+    query: str,
+    documents: list[Document],
+    search_kwargs: dict[str, Any],
+    configuration: RetrieverConfig,
+) -> list[Document]:
+    """Fuse the vector search results with the lexical index of the collection.
+
+    Both rankings are combined with reciprocal rank fusion and cut to the search `k`,
+    the vector results are returned unchanged if the collection has no lexical index.
+    """
+    index = load_lexical_index(configuration.retriever_provider, collection_name)
+    if index is None:
+        return documents
+    k = search_kwargs.get("k", 4)
+    hits = index.search(query, k=k, where=search_kwargs.get("filter"))
+    by_id = {doc.id: doc for doc in documents}
+    missing = [doc_id for doc_id, _ in hits if doc_id not in by_id]
+    if missing:
+        by_id.update({doc.id: doc for doc in store.get_by_ids(missing)})
+    fused = reciprocal_rank_fusion(
+        [[doc.id for doc in documents], [doc_id for doc_id, _ in hits]],  # type: ignore
+        k=configuration.rrf_k,
+    )
+    return [by_id[doc_id] for doc_id, _ in fused[:k] if doc_id in by_id]
+
+
+def expand_parents(
+    collection_name: str, documents: list[Document], configuration: RetrieverConfig
+) -> list[Document]:
+    """Replace the chunks by their parent section, within the parent token budget.
+
+    A parent takes the place of its best ranked chunk and its other chunks are dropped.
+    The chunks without parent, or whose parent does not fit in the remaining budget,
+    are kept as they are.
+    """
+    parent_ids = [doc.metadata["parent_id"] for doc in documents if doc.metadata.get("parent_id")]
+    if not parent_ids:
+        return documents
+    parents = get_parent_store(collection_name).get(list(dict.fromkeys(parent_ids)))
+    budget = configuration.parent_token_budget
+    expanded: list[Document] = []
+    used: set[str] = set()
+    for doc in documents:
+        parent = parents.get(doc.metadata.get("parent_id", ""))
+        if parent is None:
+            expanded.append(doc)
+            continue
+        if parent.id in used:
+            continue
+        tokens = count_tokens(parent.page_content)
+        if tokens > budget:
+            expanded.append(doc)
+            continue
+        budget -= tokens
+        used.add(parent.id)  # type: ignore
+        parent.metadata["distance"] = doc.metadata.get("distance")
+        expanded.append(parent)
+    return expanded
 
 
 def retrieve_in_parallel(state: ResearcherState) -> list[Send]:
     """Create parallel retrieval tasks for each generated query."""
+    embeddings = state.query_embeddings
+    if len(embeddings) != len(state.queries):
+        embeddings = [None] * len(state.queries)
     return [
         Send(
             "retrieve_documents",
-            cast(QueryState, query),
+            EmbeddedQueryState(**query.model_dump(), embedding=embedding),
         )
-        for query in state.queries
+        for query, embedding in zip(state.queries, embeddings)
     ]
@@ -60,3 +60,10 @@ class AgentState(InputState, RouterState):
                     "This is a list of documents that the agent can reference.",
     )
     answer: str = Field(default="", description="Final answer. Useful for evaluations")
+    response_metrics: dict[str, float] = Field(
+        default_factory=dict,
+        description=(
+            "Latency metrics of the streamed response: time to first token, "
+            "total time, output tokens and tokens per second."
+        ),
+    )
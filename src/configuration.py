@@ -4,7 +4,7 @@ Configuration for the retrieval graph.
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import Literal, Any, Annotated
+from typing import Literal, Any, Annotated, Optional
 from pydantic import BaseModel, Field
 
 # Add the project root to sys.path for relative imports
@@ -29,6 +29,14 @@ class LLMConfig(BaseModel):
         ),
     )
 
+    stream_response: bool = Field(
+        default=True,
+        description=(
+            "Whether to stream the response tokens as they are generated, "
+            "the full answer is still returned at the end."
+        ),
+    )
+
 
 class EmbeddingsConfig(BaseModel):
     """Configuration for the embeddings."""
@@ -40,6 +48,30 @@ class EmbeddingsConfig(BaseModel):
         description="Name of the embedding model to use. Must be a valid embedding model name.",
     )
 
+    embedding_cache_size: int = Field(
+        default=1024,
+        ge=0,
+        description="The maximum number of query embeddings kept in memory, 0 disables the cache.",
+    )
+
+    embedding_cache_ttl: Optional[float] = Field(
+        default=3600,
+        description="Seconds a cached query embedding stays in memory, None means no expiry.",
+    )
+
+    embedding_cache_persist: bool = Field(
+        default=False,
+        description="Whether to also persist query embeddings in a local SQLite database.",
+    )
+
+    def embedding_kwargs(self) -> dict[str, Any]:
+        """Get the keyword arguments of `get_embeddings_model` from the configuration."""
+        return {
+            "cache_size": self.embedding_cache_size,
+            "cache_ttl": self.embedding_cache_ttl,
+            "cache_persist": self.embedding_cache_persist,
+        }
+
 
 class RetrieverConfig(EmbeddingsConfig):
     """Configuration for the retriever."""
@@ -57,20 +89,247 @@ class RetrieverConfig(EmbeddingsConfig):
     )
 
     chunk_size: int = Field(
-        default=4000,
+        default=1000,
         description="The maximum number of tokens in a chunk.",
     )
 
     chunk_overlap: int = Field(
-        default=200,
+        default=50,
         description="The number of tokens to overlap between chunks.",
     )
 
+    parent_chunk_size: int = Field(
+        default=0,
+        ge=0,
+        description=(
+            "The maximum number of tokens in a parent section, 0 disables the parent documents. "
+            "The pages are split into parent sections kept in the parent store, and the "
+            "sections into the chunks of `chunk_size` tokens searched in the vector store."
+        ),
+    )
+
     search_kwargs: dict[str, Any] = Field(
         default_factory=dict,
         description="Additional keyword arguments to pass to the search function of the retriever.",
     )
 
+    retrieval_mode: Literal["vector", "hybrid"] = Field(
+        default="hybrid",
+        description=(
+            "How documents are searched. `hybrid` fuses the vector search with the lexical "
+            "(BM25) index built at ingest time, falling back to vector search without an index."
+        ),
+    )
+
+    rrf_k: int = Field(
+        default=60,
+        ge=1,
+        description="The rank constant of the reciprocal rank fusion used in hybrid mode.",
+    )
+
+    parent_retrieval: bool = Field(
+        default=True,
+        description=(
+            "Whether to return the parent section of the retrieved chunks instead of the "
+            "chunks, for the collections ingested with parent documents."
+        ),
+    )
+
+    parent_token_budget: int = Field(
+        default=4000,
+        ge=0,
+        description=(
+            "The maximum number of tokens of parent sections returned by a search, the chunks "
+            "whose parent does not fit are returned as they are."
+        ),
+    )
+
+    max_concurrent_retrievals: int = Field(
+        default=8,
+        ge=1,
+        description=(
+            "The maximum number of blocking vector searches running at the same time. "
+            "Searches are offloaded to a thread pool of this size to keep the event loop free."
+        ),
+    )
+
+
+class ResearchConfig(BaseModel):
+    """Configuration for the research stage."""
+
+    research_mode: Literal["sequential", "parallel"] = Field(
+        default="sequential",
+        description=(
+            "How the steps of the research plan are executed. Use `parallel` when the steps "
+            "are independent of each other to research them concurrently."
+        ),
+    )
+
+    max_parallel_steps: int = Field(
+        default=3,
+        ge=1,
+        description="The maximum number of research steps running at the same time in parallel mode.",
+    )
+
+
+class RerankConfig(BaseModel):
+    """Configuration for the reranking of the retrieved documents."""
+
+    reranker: Literal["none", "bm25"] = Field(
+        default="bm25",
+        description=(
+            "The reranker used to order the retrieved documents before building the "
+            "response context. `none` keeps the retrieval order."
+        ),
+    )
+
+    context_token_budget: int = Field(
+        default=12000,
+        ge=0,
+        description="The maximum number of tokens of documents sent to the response model.",
+    )
+
+
+class ResponseCacheConfig(BaseModel):
+    """Configuration for the semantic response cache."""
+
+    response_cache_enabled: bool = Field(
+        default=False,
+        description=(
+            "Whether to answer near-duplicate questions from the semantic response cache "
+            "instead of running the whole research pipeline."
+        ),
+    )
+
+    response_cache_threshold: float = Field(
+        default=0.95,
+        ge=0,
+        le=1,
+        description="The minimum cosine similarity between two questions to reuse a cached answer.",
+    )
+
+
+class IngestConfig(RetrieverConfig):
+    """Configuration for the ingestion of the documents."""
+
+    ingest_mode: Literal["concurrent", "streaming", "incremental"] = Field(
+        default="concurrent",
+        description=(
+            "`concurrent` crawls the sources concurrently, the pages of each source are split "
+            "and indexed in batches as they are crawled. "
+            "`streaming` flows the pages of all sources through one bounded queue into a "
+            "background indexer in fixed-size batches, keeping the memory usage constant. "
+            "`incremental` is like `concurrent`, but only fetches the pages of a source with a "
+            "sitemap whose `lastmod` is newer than their indexed version."
+        ),
+    )
+
+    text_splitter: Literal["markdown", "recursive"] = Field(
+        default="markdown",
+        description=(
+            "`markdown` splits the extracted pages along their headings, code blocks and "
+            "tables, and adds the path of the headings to the chunks. `recursive` splits them "
+            "on paragraphs, lines and words."
+        ),
+    )
+
+    ingest_batch_size: int = Field(
+        default=64,
+        ge=1,
+        description="The number of pages split and indexed together as they are crawled.",
+    )
+
+    max_concurrent_collections: int = Field(
+        default=2,
+        ge=1,
+        description="The maximum number of collections ingested at the same time.",
+    )
+
+    max_concurrent_sources: int = Field(
+        default=3,
+        ge=1,
+        description="The maximum number of sources crawled at the same time.",
+    )
+
+    max_connections: int = Field(
+        default=20,
+        ge=1,
+        description="The size of the connection pool shared by all the crawled sources.",
+    )
+
+    requests_per_second: float = Field(
+        default=10.0,
+        description="The global rate limit of the crawl requests, 0 disables the limit.",
+    )
+
+    ingest_embedding_cache: bool = Field(
+        default=True,
+        description=(
+            "Whether to keep the embeddings of the ingested chunks in the persistent embedding "
+            "store, so rebuilding or re-chunking a collection only embeds the new text."
+        ),
+    )
+
+    embedding_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="The maximum number of embedding requests in flight during the ingestion.",
+    )
+
+    embedding_tokens_per_minute: int = Field(
+        default=1_000_000,
+        ge=0,
+        description="The token budget of the embedding requests per minute, 0 disables it.",
+    )
+
+    embedding_requests_per_minute: int = Field(
+        default=3_000,
+        ge=0,
+        description="The budget of embedding requests per minute, 0 disables it.",
+    )
+
+    embedding_batch_tokens: int = Field(
+        default=50_000,
+        ge=1,
+        description="The maximum number of tokens embedded in one request.",
+    )
+
+    index_batch_size: int = Field(
+        default=1000,
+        ge=1,
+        description=(
+            "The number of chunks written to the vector store at once, "
+            "their embedding requests are sent concurrently."
+        ),
+    )
+
+    crawl_cache: bool = Field(
+        default=True,
+        description=(
+            "Whether to send conditional requests and skip the pages unchanged since the "
+            "previous crawl. Disable it to extract every page again after a parser change."
+        ),
+    )
+
+    extraction_workers: int = Field(
+        default_factory=lambda: os.cpu_count() or 1,
+        ge=0,
+        description=(
+            "The number of processes extracting the crawled pages, "
+            "0 extracts them in the ingest process."
+        ),
+    )
+
+    def ingest_embedding_kwargs(self) -> dict[str, Any]:
+        """Get the keyword arguments of `get_ingest_embeddings_model` from the configuration."""
+        return {
+            "cache_persist": self.ingest_embedding_cache,
+            "max_concurrency": self.embedding_concurrency,
+            "tokens_per_minute": self.embedding_tokens_per_minute,
+            "requests_per_minute": self.embedding_requests_per_minute,
+            "max_batch_tokens": self.embedding_batch_tokens,
+        }
+
 
 class PromptConfig(BaseModel):
     """Configuration for the prompts."""
@@ -104,7 +363,14 @@ class PromptConfig(BaseModel):
     )
 
 
-class Configuration(LLMConfig, RetrieverConfig, PromptConfig):
+class Configuration(
+    LLMConfig,
+    RetrieverConfig,
+    ResearchConfig,
+    RerankConfig,
+    ResponseCacheConfig,
+    PromptConfig,
+):
     """Configuration for the retrieval graph."""
 
 
@@ -0,0 +1,139 @@
+"""
+Parent document store of the ingested collections.
+
+With parent documents, the pages are split into sections (the parents) kept here and the
+sections into the small chunks indexed in the vector store, each chunk pointing to its
+parent with `parent_id`. The search matches the small chunks, and the retrieval returns
+their parent section instead when it fits in the token budget.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import json
+import sqlite3
+import threading
+from typing import Iterable, Optional
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.utils import get_parent_store_db_path
+
+
+class ParentStore:
+    """Parent documents of a collection backed by SQLite, keyed by id and by `source`."""
+
+    def __init__(self, namespace: str, path: Optional[str] = None):
+        self.namespace = namespace
+        self.path = path or get_parent_store_db_path()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # the retrievals read the parents while a collection is ingested
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parents ("
+            "namespace TEXT NOT NULL, parent_id TEXT NOT NULL, source TEXT NOT NULL, "
+            "content TEXT NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (namespace, parent_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS parents_source ON parents (namespace, source)"
+        )
+        self._conn.commit()
+
+    def get(self, parent_ids: list[str]) -> dict[str, Document]:
+        """Get the parents with the given ids, the missing ones are left out."""
+        parents: dict[str, Document] = {}
+        with self._lock:
+            for i in range(0, len(parent_ids), 500):
+                batch = parent_ids[i : i + 500]
+                rows = self._conn.execute(
+                    "SELECT parent_id, content, metadata FROM parents WHERE namespace = ? "
+                    f"AND parent_id IN ({', '.join('?' * len(batch))})",
+                    (self.namespace, *batch),
+                ).fetchall()
+                for parent_id, content, metadata in rows:
+                    parents[parent_id] = Document(
+                        id=parent_id, page_content=content, metadata=json.loads(metadata)
+                    )
+        return parents
+
+    def replace(self, parents: dict[str, list[Document]]):
+        """Replace the parents of each source by the given ones, they must have an id."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM parents WHERE namespace = ? AND source = ?",
+                [(self.namespace, source) for source in parents],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parents (namespace, parent_id, source, content, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.namespace,
+                        doc.id,
+                        source,
+                        doc.page_content,
+                        json.dumps(doc.metadata, default=str),
+                    )
+                    for source, docs in parents.items()
+                    for doc in docs
+                ],
+            )
+            self._conn.commit()
+
+    def delete_sources(self, sources: Iterable[str]):
+        """Delete the parents of the given sources."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM parents WHERE namespace = ? AND source = ?",
+                [(self.namespace, source) for source in sources],
+            )
+            self._conn.commit()
+
+    def retain_sources(self, sources: set[str]) -> int:
+        """Delete the parents of the sources not in `sources`, return how many sources."""
+        with self._lock:
+            stored = {
+                source
+                for (source,) in self._conn.execute(
+                    "SELECT DISTINCT source FROM parents WHERE namespace = ?", (self.namespace,)
+                )
+            }
+        stale = stored - sources
+        self.delete_sources(stale)
+        return len(stale)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "ParentStore":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+_shared_stores: dict[tuple[str, str], ParentStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_parent_store(namespace: str, path: Optional[str] = None) -> ParentStore:
+    """Get the parent store of a collection shared by the retrievals, kept open."""
+    key = (namespace, path or get_parent_store_db_path())
+    with _shared_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = ParentStore(namespace, key[1])
+            _shared_stores[key] = store
+        return store
+
+
+if __name__ == "__main__":
+    print(get_parent_store_db_path())
+    with ParentStore("test_collection") as test_store:
+        test_store.replace(
+            {"https://example.com/": [Document(id="p1", page_content="# Title\n\nText")]}
+        )
+        print(test_store.get(["p1", "p2"]))
+        print(test_store.retain_sources(set()))
@@ -2,15 +2,450 @@
 Embeddings for the retrieval graph.
 """
 # pylint: disable=wrong-import-position
+import os
+import sys
+import time
+import random
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import openai
 from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
 from langchain_openai import OpenAIEmbeddings
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.cache import LRUCache
+from src.utils import count_tokens, get_embedding_cache_db_path
 
-def get_embeddings_model(model: str = "openai/text-embedding-3-small") -> Embeddings:
-    """Get the embeddings model."""
+# the errors worth retrying, the others would fail again
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def get_embeddings_model(
+    model: str = "openai/text-embedding-3-small",
+    cache_size: int = 0,
+    cache_ttl: Optional[float] = None,
+    cache_persist: bool = False,
+    **kwargs,
+) -> Embeddings:
+    """Get the embeddings model, wrapped in a cache if `cache_size` or `cache_persist` is set.
+
+    The keyword arguments are passed to the model of the provider.
+    """
+    fully_specified_name = model
     provider, model = model.split("/", maxsplit=1)
     match provider:
         case "openai":
-            return OpenAIEmbeddings(model=model)
+            embedding: Embeddings = OpenAIEmbeddings(model=model, **kwargs)
         case _:
             raise ValueError(f"Unsupported embedding provider: {provider}")
+    if cache_size > 0 or cache_persist:
+        return CachedEmbeddings(
+            embedding,
+            model=fully_specified_name,
+            cache_size=cache_size,
+            cache_ttl=cache_ttl,
+            store=EmbeddingStore() if cache_persist else None,
+        )
+    return embedding
+
+
+def get_ingest_embeddings_model(
+    model: str,
+    cache_persist: bool = True,
+    max_concurrency: int = 4,
+    tokens_per_minute: int = 1_000_000,
+    requests_per_minute: int = 3_000,
+    max_batch_tokens: int = 50_000,
+) -> Embeddings:
+    """Get the embeddings model of the ingestion, backed by the persistent store if set.
+
+    The chunks are embedded in concurrent batches, see `ConcurrentEmbeddings`. They are
+    keyed by their exact text so that rebuilding or re-chunking a collection only embeds
+    the new text, nothing is kept in memory since the chunks of a run differ.
+    """
+    embedding: Embeddings = ConcurrentEmbeddings(
+        # the retries are left to the wrapper, which spreads them with jitter
+        get_embeddings_model(model, max_retries=0),
+        max_concurrency=max_concurrency,
+        tokens_per_minute=tokens_per_minute,
+        requests_per_minute=requests_per_minute,
+        max_batch_tokens=max_batch_tokens,
+    )
+    if not cache_persist:
+        return embedding
+    return CachedEmbeddings(
+        embedding, model=model, cache_size=0, store=EmbeddingStore(), normalize=False
+    )
+
+
+class EmbeddingStore:
+    """Persistent embedding store backed by SQLite, keyed by the hash of (model, text)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_embedding_cache_db_path()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # the collections ingested at the same time share the database
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def mget(self, keys: list[str]) -> list[Optional[list[float]]]:
+        """Get the vectors of the given keys, None for the missing ones."""
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            # stay below SQLite's limit on the number of host parameters
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("d", blob).tolist()
+        return [found.get(key) for key in keys]
+
+    def mset(self, items: list[tuple[str, str, list[float]]]):
+        """Store (key, model, vector) items."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                [(key, model, array("d", vector).tobytes()) for key, model, vector in items],
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-memory LRU/TTL tier and an optional persistent tier.
+
+    Texts are keyed by the hash of the model name and the whitespace-normalized text,
+    only the texts missing from both tiers are sent to the wrapped model, in one batch.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        cache_size: int = 1024,
+        cache_ttl: Optional[float] = None,
+        store: Optional[EmbeddingStore] = None,
+        normalize: bool = True,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.memory: LRUCache[list[float]] = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.store = store
+        self.normalize = normalize
+        self.store_hits = 0
+
+    def key(self, text: str) -> str:
+        """Get the cache key of a text."""
+        if self.normalize:
+            text = " ".join(text.split())
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts: list[str]) -> tuple[list[str], list[Optional[list[float]]]]:
+        """Look up the texts in both tiers."""
+        keys = [self.key(text) for text in texts]
+        vectors: list[Optional[list[float]]] = [self.memory.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if self.store is not None and missing:
+            stored = self.store.mget([keys[i] for i in missing])
+            for i, vector in zip(missing, stored):
+                if vector is not None:
+                    vectors[i] = vector
+                    self.memory.set(keys[i], vector)
+                    self.store_hits += 1
+        return keys, vectors
+
+    def _missing(
+        self, texts: list[str], keys: list[str], vectors: list[Optional[list[float]]]
+    ) -> tuple[list[int], list[str]]:
+        """Get the positions and the unique keys of the texts to embed."""
+        positions: dict[str, int] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None and keys[i] not in positions:
+                positions[keys[i]] = i
+        indices = list(positions.values())
+        return indices, [texts[i] for i in indices]
+
+    def _fill(
+        self,
+        keys: list[str],
+        vectors: list[Optional[list[float]]],
+        indices: list[int],
+        embedded: list[list[float]],
+    ) -> list[list[float]]:
+        """Write the new vectors to both tiers and fill the holes."""
+        new = {keys[i]: vector for i, vector in zip(indices, embedded)}
+        for key, vector in new.items():
+            self.memory.set(key, vector)
+        if self.store is not None and new:
+            self.store.mset([(key, self.model, vector) for key, vector in new.items()])
+        return [vector if vector is not None else new[key] for key, vector in zip(keys, vectors)]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed search docs."""
+        keys, vectors = self._lookup(texts)
+        indices, to_embed = self._missing(texts, keys, vectors)
+        embedded = self.embeddings.embed_documents(to_embed) if to_embed else []
+        return self._fill(keys, vectors, indices, embedded)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed query text."""
+        keys, vectors = self._lookup([text])
+        if vectors[0] is not None:
+            return vectors[0]
+        return self._fill(keys, vectors, [0], [self.embeddings.embed_query(text)])[0]
+
+    async def _alookup(
+        self, texts: list[str]
+    ) -> tuple[list[str], list[Optional[list[float]]]]:
+        """Look up the texts in both tiers, the sqlite reads run off the event loop."""
+        if self.store is None:
+            return self._lookup(texts)
+        return await run_in_executor(None, self._lookup, texts)
+
+    async def _afill(
+        self,
+        keys: list[str],
+        vectors: list[Optional[list[float]]],
+        indices: list[int],
+        embedded: list[list[float]],
+    ) -> list[list[float]]:
+        """Write the new vectors to both tiers, the sqlite writes run off the event loop."""
+        if self.store is None or not indices:
+            return self._fill(keys, vectors, indices, embedded)
+        return await run_in_executor(None, self._fill, keys, vectors, indices, embedded)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Asynchronous Embed search docs."""
+        keys, vectors = await self._alookup(texts)
+        indices, to_embed = self._missing(texts, keys, vectors)
+        embedded = await self.embeddings.aembed_documents(to_embed) if to_embed else []
+        return await self._afill(keys, vectors, indices, embedded)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Asynchronous Embed query text."""
+        keys, vectors = await self._alookup([text])
+        if vectors[0] is not None:
+            return vectors[0]
+        embedded = await self.embeddings.aembed_query(text)
+        return (await self._afill(keys, vectors, [0], [embedded]))[0]
+
+    def stats(self) -> dict[str, float]:
+        """Get the hit counters of both tiers and the overall hit rate."""
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.store_hits
+        return {
+            "memory_hits": memory["hits"],
+            "store_hits": self.store_hits,
+            "misses": memory["misses"] - self.store_hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+class RateBudget:
+    """Token bucket refilled continuously with `limit` units per minute, 0 means no limit."""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self._available = float(limit)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Reserve some units, return the seconds to wait before using them."""
+        if self.limit <= 0:
+            return 0.0
+        rate = self.limit / 60
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.limit, self._available + (now - self._updated) * rate)
+            self._updated = now
+            # a reservation larger than the whole budget waits for a full bucket
+            self._available -= min(amount, self.limit)
+            return max(0.0, -self._available / rate)
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """Embeddings wrapper sending several batches at once within rate budgets.
+
+    The texts are packed in batches of at most `max_batch_tokens` tokens and
+    `max_batch_size` texts, up to `max_concurrency` batches are in flight and each one
+    waits for its share of the tokens-per-minute and requests-per-minute budgets. The
+    retryable errors are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_concurrency: int = 4,
+        tokens_per_minute: int = 1_000_000,
+        requests_per_minute: int = 3_000,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 512,
+        max_retries: int = 6,
+        max_backoff: float = 60.0,
+    ):
+        self.embeddings = embeddings
+        self.max_concurrency = max_concurrency
+        self.token_budget = RateBudget(tokens_per_minute)
+        self.request_budget = RateBudget(requests_per_minute)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def batches(self, texts: list[str]) -> list[tuple[list[int], int]]:
+        """Pack the texts in batches, get the positions and the token count of each one."""
+        batches: list[tuple[list[int], int]] = []
+        indices: list[int] = []
+        tokens = 0
+        for i, text in enumerate(texts):
+            num_tokens = count_tokens(text)
+            if indices and (
+                tokens + num_tokens > self.max_batch_tokens or len(indices) >= self.max_batch_size
+            ):
+                batches.append((indices, tokens))
+                indices, tokens = [], 0
+            indices.append(i)
+            tokens += num_tokens
+        if indices:
+            batches.append((indices, tokens))
+        return batches
+
+    def _wait(self, tokens: int) -> float:
+        """Reserve a request of `tokens` tokens, get the seconds to wait before sending it."""
+        return max(self.token_budget.reserve(tokens), self.request_budget.reserve(1))
+
+    def _backoff(self, attempt: int) -> float:
+        """Get the seconds to wait before a retry."""
+        return random.uniform(0, min(self.max_backoff, 2**attempt))
+
+    def _count(self, **counts: float):
+        """Add to the throughput counters."""
+        with self._lock:
+            self._counts.update(counts)
+
+    def _embed_batch(self, texts: list[str], tokens: int) -> list[list[float]]:
+        """Embed a batch, retrying the retryable errors."""
+        attempt = 0
+        while True:
+            time.sleep(self._wait(tokens))
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except RETRYABLE_ERRORS:
+                if attempt >= self.max_retries:
+                    raise
+                self._count(retries=1)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._count(requests=1, chunks=len(texts), tokens=tokens)
+            return vectors
+
+    async def _aembed_batch(self, texts: list[str], tokens: int) -> list[list[float]]:
+        """Asynchronously embed a batch, retrying the retryable errors."""
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._wait(tokens))
+            try:
+                vectors = await self.embeddings.aembed_documents(texts)
+            except RETRYABLE_ERRORS:
+                if attempt >= self.max_retries:
+                    raise
+                self._count(retries=1)
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._count(requests=1, chunks=len(texts), tokens=tokens)
+            return vectors
+
+    @staticmethod
+    def _merge(
+        num_texts: int, batches: list[tuple[list[int], int]], results: list[list[list[float]]]
+    ) -> list[list[float]]:
+        """Put the vectors of the batches back in the order of the texts."""
+        vectors: list[list[float]] = [[] for _ in range(num_texts)]
+        for (indices, _), batch_vectors in zip(batches, results):
+            for i, vector in zip(indices, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed search docs."""
+        start = time.perf_counter()
+        batches = self.batches(texts)
+        results = list(
+            self._executor.map(
+                lambda batch: self._embed_batch([texts[i] for i in batch[0]], batch[1]), batches
+            )
+        )
+        self._count(seconds=time.perf_counter() - start)
+        return self._merge(len(texts), batches, results)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed query text."""
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Asynchronous Embed search docs."""
+        start = time.perf_counter()
+        batches = self.batches(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(indices: list[int], tokens: int) -> list[list[float]]:
+            async with semaphore:
+                return await self._aembed_batch([texts[i] for i in indices], tokens)
+
+        results = await asyncio.gather(*(embed(*batch) for batch in batches))
+        self._count(seconds=time.perf_counter() - start)
+        return self._merge(len(texts), batches, results)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Asynchronous Embed query text."""
+        return await self.embeddings.aembed_query(text)
+
+    def close(self):
+        """Shut down the thread pool of the synchronous batches."""
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict[str, float]:
+        """Get the request counters and the embedding throughput."""
+        with self._lock:
+            counts = dict(self._counts)
+        seconds = counts.get("seconds", 0.0)
+        return {
+            "requests": counts.get("requests", 0),
+            "retries": counts.get("retries", 0),
+            "chunks": counts.get("chunks", 0),
+            "tokens": counts.get("tokens", 0),
+            "chunks_per_second": counts.get("chunks", 0) / seconds if seconds else 0.0,
+            "tokens_per_second": counts.get("tokens", 0) / seconds if seconds else 0.0,
+        }
@@ -0,0 +1,159 @@
+"""
+Crawl cache of the ingestion, what was fetched and extracted for each url.
+
+The validators (ETag, Last-Modified) of a page are sent back as a conditional request on
+the next crawl, and the hashes of its raw html and extracted content tell whether it
+changed. The links of a page are kept so the crawl goes on below a `304 Not Modified`,
+and its extracted markdown so it can be re-indexed without being fetched again.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, NamedTuple, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from src.utils import get_crawl_cache_db_path
+
+
+def hash_text(text: str) -> str:
+    """Hash a raw page or an extracted content."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_content(metadata: dict[str, Any], content: str, split_key: str = "") -> str:
+    """Hash an extracted page with its metadata and how it is split, all are indexed."""
+    return hash_text(f"{split_key}\0{json.dumps(metadata, sort_keys=True, default=str)}{content}")
+
+
+class CrawlEntry(NamedTuple):
+    """What the crawl cache keeps about a url."""
+
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    html_hash: str = ""
+    content_hash: str = ""
+    links: list[str] = []
+    metadata: dict[str, Any] = {}
+    markdown: str = ""
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Get the headers of a conditional request for the url."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class CrawlCache:
+    """Crawl cache of a collection backed by SQLite, keyed by url."""
+
+    def __init__(self, namespace: str, path: Optional[str] = None):
+        self.namespace = namespace
+        self.path = path or get_crawl_cache_db_path()
+        self.opened_at = time.time()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # the collections ingested at the same time share the database
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_cache ("
+            "namespace TEXT NOT NULL, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "html_hash TEXT NOT NULL, content_hash TEXT NOT NULL, links TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, markdown TEXT NOT NULL, crawled_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, url))"
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[CrawlEntry]:
+        """Get the entry of a url, None if it was never crawled."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, html_hash, content_hash, links, metadata, markdown "
+                "FROM crawl_cache WHERE namespace = ? AND url = ?",
+                (self.namespace, url),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, html_hash, content_hash, links, metadata, markdown = row
+        return CrawlEntry(
+            url=url,
+            etag=etag,
+            last_modified=last_modified,
+            html_hash=html_hash,
+            content_hash=content_hash,
+            links=json.loads(links),
+            metadata=json.loads(metadata),
+            markdown=markdown,
+        )
+
+    def put(self, entries: list[CrawlEntry]):
+        """Store the entries of the urls crawled now."""
+        crawled_at = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO crawl_cache (namespace, url, etag, last_modified, "
+                "html_hash, content_hash, links, metadata, markdown, crawled_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.namespace,
+                        entry.url,
+                        entry.etag,
+                        entry.last_modified,
+                        entry.html_hash,
+                        entry.content_hash,
+                        json.dumps(entry.links),
+                        json.dumps(entry.metadata, default=str),
+                        entry.markdown,
+                        crawled_at,
+                    )
+                    for entry in entries
+                ],
+            )
+            self._conn.commit()
+
+    def delete(self, urls: list[str]):
+        """Forget the given urls."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM crawl_cache WHERE namespace = ? AND url = ?",
+                [(self.namespace, url) for url in urls],
+            )
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Forget the urls not crawled since the cache was opened, return how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM crawl_cache WHERE namespace = ? AND crawled_at < ?",
+                (self.namespace, self.opened_at),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "CrawlCache":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+if __name__ == "__main__":
+    print(get_crawl_cache_db_path())
+    with CrawlCache("test_collection") as test_cache:
+        test_cache.put([CrawlEntry(url="https://example.com/", etag='"v1"', html_hash="x")])
+        print(test_cache.get("https://example.com/"))
+        test_cache.delete(["https://example.com/"])
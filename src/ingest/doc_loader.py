@@ -4,22 +4,31 @@ Document loader for the retrieval graph.
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import Optional, Callable, Any, Union, Literal
+import time
+import asyncio
+import logging
+from typing import Optional, Callable, Any, Awaitable, NamedTuple, Union, Literal
 import requests
 import aiohttp
 from bs4 import BeautifulSoup
+from langchain_core.documents import Document
 from langchain_community.document_loaders import RecursiveUrlLoader, SitemapLoader
+from langchain_core.utils.html import extract_sub_links
 from langchain.utils.html import PREFIXES_TO_IGNORE_REGEX, SUFFIXES_TO_IGNORE_REGEX
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 from src.ingest.parsers.basic_sitemap import (
     sitemap_meta_extractor,
     site_map_parsing_function,
+    parse_sitemap,
 )
 from src.ingest.parsers.basic_recursive_url import (
     recursive_url_metadata_extractor,
     recursive_url_extractor,
 )
+from src.ingest.crawl_cache import CrawlCache, CrawlEntry, hash_text
+
+logger = logging.getLogger(__name__)
 
 
 # ==================
@@ -54,10 +63,30 @@ def site_map_loader(
     return loader.load()
 
 
+async def afetch_sitemap(
+    path: str, session: aiohttp.ClientSession
+) -> dict[str, Optional[float]]:
+    """Fetch a sitemap and its nested sitemaps, get the lastmod timestamp of each url."""
+    async with session.get(path) as response:
+        response.raise_for_status()
+        raw_xml = await response.text()
+    urls, sitemaps = parse_sitemap(raw_xml)
+    for nested_urls in await asyncio.gather(
+        *(afetch_sitemap(sitemap, session) for sitemap in sitemaps)
+    ):
+        urls.update(nested_urls)
+    return urls
+
+
 # ==================
 # RecursiveUrlLoader
 # ==================
 
+LINK_REGEX = (
+    f"href=[\"']{PREFIXES_TO_IGNORE_REGEX}((?:{SUFFIXES_TO_IGNORE_REGEX}.)*?)"
+    r"(?:[\#'\"]|\/[\#'\"])"
+)
+
 
 def recursive_url_loader(
     path: str,
@@ -80,16 +109,169 @@ def recursive_url_loader(
         prevent_outside=True,
         use_async=True,
         timeout=600,
-        link_regex=(
-            f"href=[\"']{PREFIXES_TO_IGNORE_REGEX}((?:{SUFFIXES_TO_IGNORE_REGEX}.)*?)"
-            r"(?:[\#'\"]|\/[\#'\"])"
-        ),
+        link_regex=LINK_REGEX,
         check_response_status=True,
         exclude_dirs=filter_urls,
     )
     return loader.load()
 
 
+class CrawledPage(NamedTuple):
+    """A page reached by `acached_recursive_url_crawl`."""
+
+    status: Literal["changed", "unchanged", "gone"]
+    entry: CrawlEntry
+    """The entry to cache, a changed page still has the content of its previous crawl."""
+    raw_doc: Optional[Document] = None
+    """The raw html of a changed page, to extract."""
+
+
+async def afetch_page(
+    url: str,
+    session: aiohttp.ClientSession,
+    cache: Optional[CrawlCache] = None,
+    base_url: Optional[str] = None,
+    filter_urls: Optional[list[str]] = None,
+    meta_kwargs: Optional[dict[str, Any]] = None,
+    raise_on_failure: bool = False,
+) -> Optional[CrawledPage]:
+    """Fetch a page with a conditional request if it is in the cache.
+
+    A page answering `304 Not Modified`, or with the same raw html as in the cache, is
+    unchanged and keeps its cached links. A page answering 404 or 410 is gone. Other
+    failures are logged and keep the cached page, None if the page is not cached.
+    """
+    meta_kwargs = meta_kwargs or {}
+    cached = cache.get(url) if cache is not None else None
+    status = None
+    try:
+        async with session.get(
+            url, headers=cached.conditional_headers() if cached else None
+        ) as response:
+            status = response.status
+            headers = response.headers
+            text = "" if status == 304 else await response.text()
+        if status == 304 and cached is None:
+            raise ValueError("Received HTTP status 304 without a conditional request")
+        if status >= 400:
+            raise ValueError(f"Received HTTP status {status}")
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        if raise_on_failure:
+            raise
+        if cached is None:
+            logger.warning("Unable to load %s: %r", url, e)
+            return None
+        if status in (404, 410):
+            return CrawledPage("gone", cached)
+        logger.warning("Unable to load %s, keeping the cached page: %r", url, e)
+        return CrawledPage("unchanged", cached)
+
+    validators = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+    if status == 304:
+        entry = cached._replace(**{key: value for key, value in validators.items() if value})
+        return CrawledPage("unchanged", entry)
+
+    entry = (cached or CrawlEntry(url=url))._replace(
+        **validators,
+        html_hash=hash_text(text),
+        # the links are cached whatever the depth, so the cache does not depend on it
+        links=extract_sub_links(
+            text,
+            url,
+            base_url=base_url or url,
+            pattern=LINK_REGEX,
+            prevent_outside=True,
+            exclude_prefixes=filter_urls or (),
+            continue_on_failure=True,
+        ),
+    )
+    if (
+        cached is not None
+        and cached.html_hash == entry.html_hash
+        and all(cached.metadata.get(key) == value for key, value in meta_kwargs.items())
+    ):
+        return CrawledPage("unchanged", entry)
+    raw_doc = Document(page_content=text, metadata={"source": url, **meta_kwargs})
+    return CrawledPage("changed", entry, raw_doc)
+
+
+async def acached_recursive_url_crawl(
+    path: str,
+    session: aiohttp.ClientSession,
+    on_page: Callable[[CrawledPage], Awaitable[None]],
+    cache: Optional[CrawlCache] = None,
+    filter_urls: Optional[list[str]] = None,
+    meta_kwargs: Optional[dict[str, Any]] = None,
+    max_depth: int = 5,
+):
+    """Crawl a recursive url like `recursive_url_loader`, with conditional requests.
+
+    Each page is awaited by `on_page`, see `afetch_page`. The crawl follows the cached links
+    of the unchanged pages, and fails if the first page fails.
+    """
+    visited: set[str] = set()
+
+    async def crawl(url: str, depth: int):
+        visited.add(url)
+        page = await afetch_page(
+            url,
+            session,
+            cache=cache,
+            base_url=path,
+            filter_urls=filter_urls,
+            meta_kwargs=meta_kwargs,
+            raise_on_failure=depth == 0,
+        )
+        if page is None:
+            return
+        await on_page(page)
+        if page.status != "gone" and depth < max_depth - 1:
+            to_visit = set(page.entry.links).difference(visited)
+            visited.update(to_visit)
+            await asyncio.gather(*(crawl(link, depth + 1) for link in to_visit))
+
+    if max_depth > 0:
+        await crawl(path, 0)
+
+
+class RateLimiter:
+    """Spread requests evenly so that at most `rate` requests start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until the next request is allowed to start."""
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def make_crawl_session(
+    max_connections: int = 20,
+    requests_per_second: float = 10.0,
+    timeout: int = 600,
+) -> aiohttp.ClientSession:
+    """Create an aiohttp session with a bounded connection pool and a global rate limit."""
+    limiter = RateLimiter(requests_per_second)
+
+    async def on_request_start(*_):
+        await limiter.acquire()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max_connections),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        trace_configs=[trace_config],
+    )
+
+
 if __name__ == "__main__":
 
     test_meta_kwargs = {"doc_type": "doc", "lang": "python"}
@@ -0,0 +1,91 @@
+"""
+Extraction stage of the ingestion, decoupled from the crawling.
+
+The crawler only keeps the raw html of the changed pages (see `acached_recursive_url_crawl`),
+the parsing runs afterwards in a process pool so that the extraction scales across cores
+instead of running inside the crawler's event loop.
+"""
+# pylint: disable=wrong-import-position
+# pylint: disable=unused-argument
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+MetadataExtractor = Callable[..., dict[str, Any]]
+Extractor = Callable[[str], str]
+# (raw_html, url, **meta_kwargs) -> (metadata, content), parsing the page only once
+PageExtractorFn = Callable[..., tuple[dict[str, Any], str]]
+
+
+def _extract_separately(
+    raw_html: str,
+    url: str,
+    metadata_extractor: MetadataExtractor,
+    extractor: Extractor,
+    **kwargs,
+) -> tuple[dict[str, Any], str]:
+    """Run a metadata extractor and a content extractor, each parsing the page."""
+    return metadata_extractor(raw_html, url, None, **kwargs), extractor(raw_html)
+
+
+def combine_extractors(
+    metadata_extractor: MetadataExtractor, extractor: Extractor
+) -> PageExtractorFn:
+    """Combine the separate extractors of a parser without a single-parse extractor."""
+    return partial(_extract_separately, metadata_extractor=metadata_extractor, extractor=extractor)
+
+
+def extract_page(doc: Document, page_extractor: PageExtractorFn) -> Optional[Document]:
+    """Extract the content and the metadata of a raw page, None if it has no content."""
+    meta_kwargs = {key: value for key, value in doc.metadata.items() if key != "source"}
+    metadata, content = page_extractor(doc.page_content, doc.metadata["source"], **meta_kwargs)
+    if not content:
+        return None
+    return Document(page_content=content, metadata=metadata)
+
+
+class ExtractionPool:
+    """Extract the raw pages kept by the crawler, in a process pool.
+
+    With 0 workers the pages are extracted in the current process.
+    """
+
+    def __init__(self, max_workers: int = 0):
+        self.max_workers = max_workers
+        self.executor = (
+            ProcessPoolExecutor(
+                max_workers=max_workers,
+                # forking a process that runs crawler and db threads is not safe
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            if max_workers > 0
+            else None
+        )
+
+    def extract(self, pages: list[tuple[Document, PageExtractorFn]]) -> list[Document]:
+        """Extract a batch of raw pages, each with the extractor of its source, in order."""
+        docs = [doc for doc, _ in pages]
+        page_extractors = [page_extractor for _, page_extractor in pages]
+        if self.executor is None:
+            results = map(extract_page, docs, page_extractors)
+        else:
+            chunksize = max(1, len(pages) // (self.max_workers * 4))
+            results = self.executor.map(extract_page, docs, page_extractors, chunksize=chunksize)
+        return [doc for doc in results if doc is not None]
+
+    def shutdown(self):
+        """Shut the process pool down."""
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self) -> "ExtractionPool":
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
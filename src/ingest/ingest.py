@@ -4,31 +4,232 @@ Ingest data into the retrieval graph.
 # pylint: disable=wrong-import-position
 import os
 import sys
+import time
+import asyncio
 import logging
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.indexes import index
+import threading
+from collections import Counter
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
+from typing import Awaitable, Callable, Iterator, Literal, NamedTuple, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_text_splitters import TextSplitter
+from langchain.indexes import index, SQLRecordManager
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
-from src.embeddings import get_embeddings_model
-from src.configuration import Configuration
+from src.embeddings import (
+    CachedEmbeddings,
+    ConcurrentEmbeddings,
+    get_ingest_embeddings_model,
+)
+from src.configuration import IngestConfig
 from src.vectorstore import get_vector_store
-from src.ingest.record_manager import get_record_manager
-from src.ingest.doc_loader import recursive_url_loader
-from src.ingest.parsers.langchain_recursive_url import (
-    langchain_recursive_url_metadata_extractor,
-    langchain_recursive_url_extractor,
-    exclude_urls_doc,
-    exclude_urls_ref,
+from src.lexical import build_lexical_index
+from src.docstore import ParentStore
+from src.ingest.record_manager import (
+    get_group_timestamps,
+    get_record_manager,
+    refresh_groups,
+)
+from src.ingest.extraction import ExtractionPool, PageExtractorFn
+from src.ingest.crawl_cache import CrawlCache, CrawlEntry, hash_content, hash_text
+from src.ingest.splitter import get_text_splitter
+from src.ingest.registry import (
+    CollectionSpec,
+    CrawlSource,
+    get_collection_spec,
+    load_collection_specs,
+)
+from src.ingest.doc_loader import (
+    CrawledPage,
+    acached_recursive_url_crawl,
+    afetch_page,
+    afetch_sitemap,
+    make_crawl_session,
 )
 
+logger = logging.getLogger(__name__)
 
 
-def ingest(collection_name: str):
-    """Ingest data into the retrieval graph."""
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    config = Configuration()
-    embedding = get_embeddings_model(config.embedding_model)
+class IngestTarget(NamedTuple):
+    """Where and how the documents of a collection are indexed."""
+
+    store: VectorStore
+    record_manager: SQLRecordManager
+    text_splitter: TextSplitter
+    embedding: Embeddings
+    split_key: str
+    """The settings of the text splitter, the documents split differently are indexed again."""
+    batch_size: int
+    """The number of chunks embedded and written to the vector store at once."""
+    parent_splitter: Optional[TextSplitter] = None
+    """Splits the pages into the parent sections, None without parent documents."""
+    parent_store: Optional[ParentStore] = None
+    """Where the parent sections are kept, None without parent documents."""
+
+    def close(self):
+        """Close the parent store, the embedding store and the embedding thread pool."""
+        if self.parent_store is not None:
+            self.parent_store.close()
+        embedding = self.embedding
+        if isinstance(embedding, CachedEmbeddings):
+            if embedding.store is not None:
+                embedding.store.close()
+            embedding = embedding.embeddings
+        if isinstance(embedding, ConcurrentEmbeddings):
+            embedding.close()
+
+
+def is_force_update() -> bool:
+    """Check if every document is indexed again, set by the `FORCE_UPDATE` env variable."""
+    return (os.environ.get("FORCE_UPDATE") or "false").lower() == "true"
+
+
+def split_documents(docs: list[Document], target: IngestTarget) -> list[Document]:
+    """Split documents into the chunks to index.
+
+    With parent documents, the documents are split into parent sections stored in the parent
+    store and the sections into the chunks, pointing to their section with `parent_id`. A
+    section that fits in one chunk is indexed as is, without parent.
+    """
+    if target.parent_splitter is None or target.parent_store is None:
+        return target.text_splitter.split_documents(docs)
+    chunks: list[Document] = []
+    parents: dict[str, list[Document]] = {doc.metadata["source"]: [] for doc in docs}
+    for parent in target.parent_splitter.split_documents(docs):
+        children = target.text_splitter.split_documents([parent])
+        if "start_index" in parent.metadata:
+            # the chunks are split from their section, their offset is made relative to the page
+            for child in children:
+                child.metadata["start_index"] += parent.metadata["start_index"]
+        if len(children) > 1:
+            source = parent.metadata["source"]
+            parent.id = hash_text(f"{source}\0{parent.page_content}")
+            parents[source].append(parent)
+            for child in children:
+                child.metadata["parent_id"] = parent.id
+        chunks.extend(children)
+    target.parent_store.replace(parents)
+    return chunks
+
+
+def index_documents(
+    docs: list[Document],
+    target: IngestTarget,
+    cleanup: Optional[Literal["incremental"]] = None,
+) -> dict[str, int]:
+    """Split and index a batch of documents, without cleaning up the other documents.
+
+    With the `incremental` cleanup the previous chunks of the indexed pages are deleted.
+    """
+    return index(
+        split_documents(docs, target),
+        target.record_manager,
+        target.store,
+        cleanup=cleanup,
+        source_id_key="source",
+        batch_size=target.batch_size,
+        force_update=is_force_update(),
+    )
+
+
+def index_crawled_pages(
+    pages: list[tuple[CrawledPage, PageExtractorFn]],
+    target: IngestTarget,
+    cache: CrawlCache,
+    extraction_pool: ExtractionPool,
+    cleanup: Optional[Literal["incremental"]] = None,
+) -> dict[str, int]:
+    """Index a batch of crawled pages, only the changed ones are split and embedded.
+
+    The changed pages are extracted, those whose content did not change are refreshed in
+    the record manager like the unchanged pages, so the cleanup keeps them. An unchanged
+    page missing from the record manager, or split with other settings, is indexed again
+    from its cached markdown.
+    """
+    changed = [(page, extractor) for page, extractor in pages if page.status == "changed"]
+    docs = extraction_pool.extract([(page.raw_doc, extractor) for page, extractor in changed])
+    extracted = {doc.metadata["source"]: doc for doc in docs}
+
+    entries: list[CrawlEntry] = []
+    to_index: list[Document] = []
+    for page, _ in pages:
+        if page.status == "gone":
+            continue
+        metadata, markdown = page.entry.metadata, page.entry.markdown
+        if page.status == "changed":
+            doc = extracted.get(page.entry.url)
+            metadata, markdown = (doc.metadata, doc.page_content) if doc else ({}, "")
+        # the hash covers the split settings, a page split with other settings is indexed again
+        entry = page.entry._replace(
+            content_hash=hash_content(metadata, markdown, target.split_key),
+            metadata=metadata,
+            markdown=markdown,
+        )
+        entries.append(entry)
+        if markdown and entry.content_hash != page.entry.content_hash:
+            to_index.append(Document(page_content=markdown, metadata=metadata))
+    to_index_urls = {doc.metadata["source"] for doc in to_index}
+    to_refresh = [entry for entry in entries if entry.markdown and entry.url not in to_index_urls]
+    refreshed = refresh_groups(target.record_manager, [entry.url for entry in to_refresh])
+    to_index.extend(
+        Document(page_content=entry.markdown, metadata=entry.metadata)
+        for entry in to_refresh
+        if entry.url not in refreshed
+    )
+
+    stats = Counter(index_documents(to_index, target, cleanup))
+    gone = [page.entry.url for page, _ in pages if page.status == "gone"]
+    cache.put(entries)
+    cache.delete(gone)
+    stats.update(
+        num_changed_pages=len(to_index),
+        num_unchanged_pages=len(refreshed),
+        num_gone_pages=len(gone),
+    )
+    return dict(stats)
+
+
+def cleanup_documents(
+    record_manager: SQLRecordManager, store: VectorStore, before: float
+) -> int:
+    """Delete the documents not indexed since `before`, like `index(cleanup="full")` does."""
+    num_deleted = 0
+    while uids := record_manager.list_keys(before=before, limit=1000):
+        store.delete(uids)
+        record_manager.delete_keys(uids)
+        num_deleted += len(uids)
+    return num_deleted
+
+
+def cleanup_source(
+    record_manager: SQLRecordManager, store: VectorStore, source: CrawlSource, before: float
+) -> list[str]:
+    """Delete the documents of the pages of a source not indexed since `before`.
+
+    Return the urls of the deleted pages.
+    """
+    stale = [
+        url
+        for url, updated_at in get_group_timestamps(record_manager).items()
+        if updated_at < before and source.in_scope(url)
+    ]
+    for i in range(0, len(stale), 500):
+        uids = record_manager.list_keys(group_ids=stale[i : i + 500])
+        if uids:
+            store.delete(uids)
+            record_manager.delete_keys(uids)
+    return stale
+
+
+def get_ingest_target(collection_name: str, config: IngestConfig) -> IngestTarget:
+    """Get the vector store, record manager, text splitter and embeddings of a collection."""
+    embedding = get_ingest_embeddings_model(
+        config.embedding_model, **config.ingest_embedding_kwargs()
+    )
     store = get_vector_store(
         provider=config.retriever_provider,
         storage_type=config.storage_type,
@@ -40,59 +241,392 @@ def ingest(collection_name: str):
         collection_name=collection_name,
         embedding_name=config.embedding_model,
     )
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap
-    )
-
-    langchain_doc = recursive_url_loader(
-        path="https://python.langchain.com/docs/",
-        filter_urls=exclude_urls_doc,
-        max_depth=4,
-        meta_kwargs={"doc_type": "doc", "lang": "python"},
-        metadata_extractor=langchain_recursive_url_metadata_extractor,
-        extractor=langchain_recursive_url_extractor,
+    record_manager.create_schema()
+    text_splitter = get_text_splitter(
+        config.text_splitter, chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap
     )
-    logger.info("Loaded %d docs from documentation", len(langchain_doc))
-
-    langchain_ref = recursive_url_loader(
-        path="https://python.langchain.com/api_reference/",
-        filter_urls=exclude_urls_ref,
-        max_depth=4,
-        meta_kwargs={"doc_type": "ref", "lang": "python"},
-        metadata_extractor=langchain_recursive_url_metadata_extractor,
-        extractor=langchain_recursive_url_extractor,
+    split_key = f"{config.text_splitter}:{config.chunk_size}:{config.chunk_overlap}"
+    if not config.parent_chunk_size:
+        return IngestTarget(
+            store, record_manager, text_splitter, embedding, split_key, config.index_batch_size
+        )
+    if config.parent_chunk_size <= config.chunk_size:
+        raise ValueError(
+            f"The parent chunk size ({config.parent_chunk_size}) "
+            f"must be larger than the chunk size ({config.chunk_size})"
+        )
+    parent_splitter = get_text_splitter(
+        config.text_splitter, chunk_size=config.parent_chunk_size, chunk_overlap=0
     )
-    logger.info("Loaded %d docs from api_reference", len(langchain_ref))
-
-    langchain_code = recursive_url_loader(
-        path="https://python.langchain.com/api_reference/_modules/",
-        max_depth=4,
-        meta_kwargs={"doc_type": "code", "lang": "python"},
-        metadata_extractor=langchain_recursive_url_metadata_extractor,
-        extractor=langchain_recursive_url_extractor,
+    return IngestTarget(
+        store,
+        record_manager,
+        text_splitter,
+        embedding,
+        f"{split_key}:{config.parent_chunk_size}",
+        config.index_batch_size,
+        parent_splitter,
+        ParentStore(collection_name),
     )
-    logger.info("Loaded %d docs from source_code", len(langchain_code))
 
-    docs_transformed = text_splitter.split_documents(
-        langchain_doc + langchain_ref + langchain_code
-    )
 
-    indexing_stats = index(
-        docs_transformed,
-        record_manager,
-        store,
-        cleanup="full",  # 旧的有的，新的没有的，会删除
-        source_id_key="source",
-        force_update=(os.environ.get("FORCE_UPDATE") or "false").lower() == "true",
-    )
+def finish_ingest(
+    collection_name: str,
+    config: IngestConfig,
+    target: IngestTarget,
+    started_at: float,
+    failed: bool,
+    cache: CrawlCache,
+    cleanup: bool = True,
+):
+    """Delete the stale documents and rebuild the lexical index after an ingest run.
+
+    The stale documents are those of the pages gone or no longer reached by the crawl,
+    `cleanup` is False when each source was cleaned up on its own.
+    """
+    if cleanup and failed:
+        # the documents of the failed source were not re-indexed and would be deleted
+        logger.warning("Skipping the cleanup because a source failed to load")
+    elif cleanup:
+        num_deleted = cleanup_documents(target.record_manager, target.store, started_at)
+        logger.info("Deleted %d stale docs", num_deleted)
+        logger.info("Forgot %d pages no longer crawled", cache.prune())
+    if target.parent_store is not None and not failed:
+        num_deleted = target.parent_store.retain_sources(
+            set(get_group_timestamps(target.record_manager))
+        )
+        logger.info("Deleted the parent sections of %d stale pages", num_deleted)
 
-    logger.info("Indexing stats: %s", indexing_stats)
+    lexical_index = build_lexical_index(target.store, config.retriever_provider, collection_name)
+    logger.info("Built the lexical index of %d docs", len(lexical_index.ids))
     # Get collection count using public API
-    num_vecs = store._collection.count()  # pylint: disable=protected-access
+    num_vecs = target.store._collection.count()  # type: ignore # pylint: disable=protected-access
     logger.info(
-        "LangChain now has this many vectors: %d",
+        "%s now has this many vectors: %d",
+        collection_name,
         num_vecs,
     )
+    embedding = target.embedding
+    if isinstance(embedding, CachedEmbeddings):
+        logger.info("Embedding cache stats of %s: %s", collection_name, embedding.stats())
+        embedding = embedding.embeddings
+    if isinstance(embedding, ConcurrentEmbeddings):
+        logger.info("Embedding throughput of %s: %s", collection_name, embedding.stats())
+
+
+async def afetch_sitemap_pages(
+    source: CrawlSource,
+    session,
+    target: IngestTarget,
+    on_page: Callable[[CrawledPage], Awaitable[None]],
+    cache: Optional[CrawlCache] = None,
+):
+    """Fetch the pages of a source listed in its sitemap and modified since they were indexed.
+
+    The other pages of the sitemap are refreshed in the record manager without being fetched,
+    a page without `lastmod` is fetched with a conditional request.
+    """
+    lastmods = {
+        url: lastmod
+        for url, lastmod in (await afetch_sitemap(source.sitemap, session)).items()
+        if source.in_scope(url)
+    }
+    indexed = await asyncio.to_thread(get_group_timestamps, target.record_manager)
+    fresh = {
+        url
+        for url, lastmod in lastmods.items()
+        if lastmod is not None and url in indexed and lastmod <= indexed[url]
+    }
+    await asyncio.to_thread(refresh_groups, target.record_manager, list(fresh))
+    logger.info(
+        "%d of the %d pages of %s were modified",
+        len(lastmods) - len(fresh),
+        len(lastmods),
+        source.name,
+    )
+
+    async def fetch(url: str):
+        page = await afetch_page(
+            url,
+            session,
+            cache=cache,
+            base_url=source.path,
+            filter_urls=source.filter_urls,
+            meta_kwargs=source.meta_kwargs,
+        )
+        if page is not None:
+            await on_page(page)
+
+    await asyncio.gather(*(fetch(url) for url in lastmods if url not in fresh))
+
+
+async def aingest(
+    collection_name: str,
+    config: IngestConfig,
+    sources: list[CrawlSource],
+    extraction_pool: ExtractionPool,
+):
+    """Ingest data into the retrieval graph, crawling the sources concurrently.
+
+    The sources share one connection pool and one rate limit. The pages of each source flow
+    through a bounded queue into extraction, splitting and indexing in batches of
+    `ingest_batch_size` pages as they are crawled, a full queue suspends the crawl of the
+    source until its batch is indexed. The batches are indexed one at a time while the other
+    sources keep crawling. In `incremental` mode the sources with a sitemap only fetch their
+    modified pages, and each source is cleaned up on its own once indexed since the pages
+    not fetched are not re-indexed.
+    """
+    target = get_ingest_target(collection_name, config)
+    started_at = target.record_manager.get_time()
+    semaphore = asyncio.Semaphore(config.max_concurrent_sources)
+    index_lock = asyncio.Lock()
+    cache = CrawlCache(collection_name)
+    read_cache = config.crawl_cache and not is_force_update()
+    incremental = config.ingest_mode == "incremental"
+
+    async def crawl(
+        source: CrawlSource, session, on_page: Callable[[CrawledPage], Awaitable[None]]
+    ):
+        async with semaphore:
+            if incremental and source.sitemap:
+                await afetch_sitemap_pages(
+                    source, session, target, on_page, cache if read_cache else None
+                )
+            else:
+                await acached_recursive_url_crawl(
+                    path=source.path,
+                    session=session,
+                    on_page=on_page,
+                    cache=cache if read_cache else None,
+                    filter_urls=source.filter_urls,
+                    meta_kwargs=source.meta_kwargs,
+                    max_depth=source.max_depth,
+                )
+
+    async def index_batch(batch: list[tuple[CrawledPage, PageExtractorFn]]) -> dict[str, int]:
+        # extraction and indexing are blocking, the crawls keep running on the loop
+        async with index_lock:
+            return await asyncio.to_thread(
+                index_crawled_pages,
+                batch,
+                target,
+                cache,
+                extraction_pool,
+                "incremental" if incremental else None,
+            )
+
+    async def ingest_source(source: CrawlSource, session) -> bool:
+        pages: asyncio.Queue = asyncio.Queue(maxsize=config.ingest_batch_size * 2)
+        done = object()
+        stopping = False
+
+        async def produce():
+            try:
+                await crawl(source, session, pages.put)
+            finally:
+                if not stopping:
+                    await pages.put(done)
+
+        producer = asyncio.create_task(produce())
+        totals: Counter[str] = Counter()
+        batch: list[tuple[CrawledPage, PageExtractorFn]] = []
+        try:
+            while True:
+                page = await pages.get()
+                if page is not done:
+                    batch.append((page, source.page_extractor))
+                if batch and (page is done or len(batch) >= config.ingest_batch_size):
+                    totals.update(await index_batch(batch))
+                    totals["num_pages"] += len(batch)
+                    batch = []
+                if page is done:
+                    break
+        except BaseException:
+            # nothing takes the pages any more, stop the crawl
+            stopping = True
+            producer.cancel()
+            raise
+        try:
+            await producer
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to crawl %s", source.name)
+            return False
+        logger.info("Indexing stats of %s: %s", source.name, dict(totals))
+        if incremental:
+            async with index_lock:
+                stale = await asyncio.to_thread(
+                    cleanup_source, target.record_manager, target.store, source, started_at
+                )
+            cache.delete(stale)
+            if target.parent_store is not None:
+                target.parent_store.delete_sources(stale)
+            logger.info("Deleted the docs of %d stale pages of %s", len(stale), source.name)
+        return True
+
+    with cache, closing(target):
+        async with make_crawl_session(
+            config.max_connections, config.requests_per_second
+        ) as session:
+            tasks = [asyncio.create_task(ingest_source(source, session)) for source in sources]
+            try:
+                crawled = await asyncio.gather(*tasks)
+            except BaseException:
+                # an indexing error stops the other sources too
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        failed = not all(crawled)
+
+        await asyncio.to_thread(
+            finish_ingest,
+            collection_name,
+            config,
+            target,
+            started_at,
+            failed,
+            cache,
+            cleanup=not incremental,
+        )
+
+
+def stream_ingest(
+    collection_name: str,
+    config: IngestConfig,
+    sources: list[CrawlSource],
+    extraction_pool: ExtractionPool,
+):
+    """Ingest data into the retrieval graph in fixed-size batches with constant memory.
+
+    The sources are crawled on an event loop in a background thread and push their pages
+    into a bounded asyncio queue, a full queue suspends the crawls until the indexer catches
+    up while the loop keeps serving the other requests. The indexer gets the pages from the
+    loop thread-safely. If the indexing fails, the crawls are cancelled and the queue is
+    drained until they end before the error is raised.
+    """
+    target = get_ingest_target(collection_name, config)
+    started_at = target.record_manager.get_time()
+    pages: asyncio.Queue = asyncio.Queue(maxsize=config.ingest_batch_size * 2)
+    done = object()
+    cache = CrawlCache(collection_name)
+    read_cache = config.crawl_cache and not is_force_update()
+    loop = asyncio.new_event_loop()
+    stopping = threading.Event()
+    crawl_finished = False
+
+    async def crawl(source: CrawlSource, session, semaphore: asyncio.Semaphore):
+        async def hand_over(page: CrawledPage):
+            if not stopping.is_set():
+                await pages.put((page, source.page_extractor))
+
+        async with semaphore:
+            await acached_recursive_url_crawl(
+                path=source.path,
+                session=session,
+                on_page=hand_over,
+                cache=cache if read_cache else None,
+                filter_urls=source.filter_urls,
+                meta_kwargs=source.meta_kwargs,
+                max_depth=source.max_depth,
+            )
+
+    async def crawl_all() -> list:
+        try:
+            semaphore = asyncio.Semaphore(config.max_concurrent_sources)
+            async with make_crawl_session(
+                config.max_connections, config.requests_per_second
+            ) as session:
+                return await asyncio.gather(
+                    *(crawl(source, session, semaphore) for source in sources),
+                    return_exceptions=True,
+                )
+        finally:
+            await pages.put(done)
+
+    def drain() -> Iterator[tuple[CrawledPage, PageExtractorFn]]:
+        nonlocal crawl_finished
+        while (page := asyncio.run_coroutine_threadsafe(pages.get(), loop).result()) is not done:
+            yield page
+        crawl_finished = True
+
+    totals: Counter[str] = Counter()
+    with cache, closing(target), closing(loop):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(loop.run_forever)
+            try:
+                crawler = asyncio.run_coroutine_threadsafe(crawl_all(), loop)
+                for batch in batched(drain(), config.ingest_batch_size):
+                    totals.update(index_crawled_pages(list(batch), target, cache, extraction_pool))
+                    totals["num_pages"] += len(batch)
+                    logger.info("Indexed %d pages so far: %s", totals["num_pages"], dict(totals))
+                results = crawler.result()
+            except BaseException:
+                if not crawl_finished:
+                    # nothing takes the pages any more, stop the crawls and unblock them
+                    stopping.set()
+                    crawler.cancel()
+                    for _ in drain():
+                        pass
+                raise
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+
+        failed = False
+        for source, result in zip(sources, results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to crawl %s", source.name, exc_info=result)
+                failed = True
+
+        finish_ingest(collection_name, config, target, started_at, failed, cache)
+
+
+async def aingest_all(specs: list[CollectionSpec], config: IngestConfig):
+    """Ingest several collections, each one with its own connection pool and rate limit.
+
+    The collections share the process pool extracting the crawled pages.
+    """
+    semaphore = asyncio.Semaphore(config.max_concurrent_collections)
+    extraction_pool = ExtractionPool(config.extraction_workers)
+
+    async def run(spec: CollectionSpec):
+        async with semaphore:
+            start = time.perf_counter()
+            collection_config = spec.ingest_config(config)
+            if collection_config.ingest_mode == "streaming":
+                await asyncio.to_thread(
+                    stream_ingest,
+                    spec.collection_name,
+                    collection_config,
+                    spec.crawl_sources(),
+                    extraction_pool,
+                )
+            else:
+                await aingest(
+                    spec.collection_name, collection_config, spec.crawl_sources(), extraction_pool
+                )
+            logger.info("Ingested %s in %.1fs", spec.collection_name, time.perf_counter() - start)
+
+    with extraction_pool:
+        results = await asyncio.gather(*(run(spec) for spec in specs), return_exceptions=True)
+    for spec, result in zip(specs, results):
+        if isinstance(result, BaseException):
+            logger.error("Failed to ingest %s", spec.collection_name, exc_info=result)
+
+
+def ingest_all(config: Optional[IngestConfig] = None, names: Optional[list[str]] = None):
+    """Ingest the collections declared in `data/metadata.json`, all of them by default."""
+    logging.basicConfig(level=logging.INFO)
+    config = config or IngestConfig()
+    if names:
+        specs = [get_collection_spec(name) for name in names]
+    else:
+        specs = load_collection_specs()
+    asyncio.run(aingest_all(specs, config))
+
+
+def ingest(collection_name: str, config: Optional[IngestConfig] = None):
+    """Ingest a collection declared in `data/metadata.json` into the retrieval graph."""
+    ingest_all(config, names=[collection_name])
 
 
 if __name__ == "__main__":
@@ -102,4 +636,5 @@ if __name__ == "__main__":
 
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
     load_dotenv(dotenv_path=os.path.join(base_dir, ".env"), override=True)
-    ingest("langchain")
+    # the collections to ingest, e.g. `python src/ingest/ingest.py langchain langgraph`
+    ingest_all(names=sys.argv[1:])
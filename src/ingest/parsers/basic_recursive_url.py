@@ -3,14 +3,31 @@
 import os
 import sys
 import re
+import copy
 from typing import Optional, Union, Literal
 import requests
 import aiohttp
 from bs4 import BeautifulSoup
+from bs4.element import Tag
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
 
 
+def get_page_title(soup: BeautifulSoup, url: str, tag: str = "h1") -> str:
+    """Get the title of the page from `tag` without its anchor link, leaving the soup untouched.
+
+    Falls back to the last part of the url when the page has no such tag.
+    """
+    title_element = soup.find(tag)
+    if not isinstance(title_element, Tag):
+        return url.rstrip("/").split("/")[-1]
+    title_element = copy.copy(title_element)
+    a_tag = title_element.find("a")
+    if a_tag:
+        a_tag.decompose()
+    return title_element.get_text()
+
+
 def recursive_url_metadata_extractor(
     raw_html: str,
     url: str,
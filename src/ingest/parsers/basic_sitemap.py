@@ -1,6 +1,7 @@
 import os
 import sys
 import re
+from datetime import datetime, timezone
 from typing import Optional, Literal
 from bs4 import BeautifulSoup
 
@@ -33,3 +34,35 @@ def sitemap_meta_extractor(  # only work for sitemap loader
 def site_map_parsing_function(soup: BeautifulSoup) -> str:
     """SitemapLoader's parsing function only accept BeautifulSoup object"""
     return re.sub(r"\n\n+", "\n\n", soup.text).strip()
+
+
+def parse_lastmod(lastmod: str) -> Optional[float]:
+    """Parse a W3C datetime `lastmod` into a timestamp, a date without time zone is UTC."""
+    try:
+        date = datetime.fromisoformat(lastmod.strip())
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def parse_sitemap(raw_xml: str) -> tuple[dict[str, Optional[float]], list[str]]:
+    """Parse a sitemap into the lastmod timestamp of each url and the nested sitemaps.
+
+    A url without `lastmod` maps to None.
+    """
+    soup = BeautifulSoup(raw_xml, "xml")
+    urls: dict[str, Optional[float]] = {}
+    for url in soup.find_all("url"):
+        loc = url.find("loc")
+        if loc is None:
+            continue
+        lastmod = url.find("lastmod")
+        urls[loc.get_text(strip=True)] = parse_lastmod(lastmod.get_text()) if lastmod else None
+    sitemaps = [
+        loc.get_text(strip=True)
+        for sitemap in soup.find_all("sitemap")
+        if (loc := sitemap.find("loc")) is not None
+    ]
+    return urls, sitemaps
@@ -7,13 +7,14 @@ Parser for the langchain recursive url.
 import os
 import sys
 import re
-from typing import Generator, Callable, Union
+from typing import Any, Generator, Callable, Union
 import aiohttp
 import requests
 from bs4 import BeautifulSoup
 from bs4.element import NavigableString, AttributeValueList, Tag, Doctype
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
+from src.ingest.parsers.basic_recursive_url import get_page_title
 
 
 def langchain_recursive_url_metadata_extractor(
@@ -24,17 +25,9 @@ def langchain_recursive_url_metadata_extractor(
 ) -> dict:
     """Extract metadata from the langchain recursive url."""
     soup = BeautifulSoup(raw_html, "lxml")
-    title_element = soup.find("h1")
-    try:
-        title_element.find("a").decompose() # type: ignore
-    except AttributeError:
-        pass
-    title = (
-        title_element.get_text() if title_element else url.rstrip("/").split("/")[-1]
-    )
     return {
         "source": url,
-        "title": title,
+        "title": get_page_title(soup, url),
         **kwargs,
     }
 
@@ -210,7 +203,7 @@ def get_text(tag: Tag) -> Generator[str, None, None]:
 
 SCAPE_TAGS = ["nav", "footer", "aside", "script", "style", "button"]
 
-def langchain_recursive_url_extractor(raw_html, parser="html.parser") -> str:
+def langchain_recursive_url_extractor(raw_html, parser="lxml") -> str:
     """Extract the text from the raw html."""
     if isinstance(raw_html, BeautifulSoup):
         soup = raw_html
@@ -224,6 +217,37 @@ def langchain_recursive_url_extractor(raw_html, parser="html.parser") -> str:
     return re.sub(r"\n\n+", "\n\n", article_markdown).strip()
 
 
+def langchain_recursive_url_page_extractor(
+    raw_html: str, url: str, parser: str = "lxml", **kwargs
+) -> tuple[dict[str, Any], str]:
+    """Extract the metadata and the text of a page, parsing the raw html only once."""
+    soup = BeautifulSoup(raw_html, parser)
+    metadata = {"source": url, "title": get_page_title(soup, url), **kwargs}
+    return metadata, langchain_recursive_url_extractor(soup)
+
+
+def _benchmark_single_parse(
+    raw_html: str, url: str, rounds: int = 20, parser: str = "lxml"
+) -> tuple[float, float]:
+    """Time the metadata and text double parse and the single parse, in seconds per page.
+
+    Both sides parse with the same backend, so only the number of parses differs.
+    """
+    import time  # pylint: disable=import-outside-toplevel
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # like `langchain_recursive_url_metadata_extractor`, with the same backend
+        get_page_title(BeautifulSoup(raw_html, parser), url)
+        langchain_recursive_url_extractor(raw_html, parser=parser)
+    double_parse = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        langchain_recursive_url_page_extractor(raw_html, url, parser=parser)
+    single_parse = (time.perf_counter() - start) / rounds
+    return double_parse, single_parse
+
+
 exclude_urls_ref = [
     "https://python.langchain.com/api_reference/_modules/",
     "https://python.langchain.com/api_reference/community/document_loaders/([^",
@@ -387,3 +411,13 @@ if __name__ == "__main__":
     doc = langchain_recursive_url_extractor(test_response.text, parser="lxml")
     md = Markdown(doc)
     console.print(md)
+
+    for backend in ("lxml", "html.parser"):
+        double_parse, single_parse = _benchmark_single_parse(
+            test_response.text, TEST_URL, parser=backend
+        )
+        print(
+            f"{backend}: double parse {double_parse * 1000:.1f}ms/page, "
+            f"single parse {single_parse * 1000:.1f}ms/page, "
+            f"speedup {double_parse / single_parse:.2f}x"
+        )
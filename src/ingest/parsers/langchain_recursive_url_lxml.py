@@ -0,0 +1,196 @@
+"""
+lxml engine of the langchain recursive url parser.
+
+Walks the lxml tree directly instead of building a BeautifulSoup tree, and produces the
+same markdown as `langchain_recursive_url_page_extractor`, see `lxml_tree` for how the
+helpers mirror bs4.
+"""
+# pylint: disable=wrong-import-position
+# pylint: disable=c-extension-no-member
+import os
+import sys
+import re
+from typing import Any, Generator, Optional, Union
+from lxml import etree
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
+from src.ingest.parsers.langchain_recursive_url import SCAPE_TAGS
+from src.ingest.parsers.lxml_tree import (
+    HEADINGS,
+    REMOVED,
+    decompose,
+    find,
+    get_classes,
+    get_page_title,
+    get_tag_text,
+    iter_nodes,
+    parse_html,
+)
+
+
+def get_title(title: etree._Element) -> Generator[str, None, None]:
+    """Get the title of the tag."""
+    a_tag = find(title, "a")
+    if a_tag is not None:
+        decompose(a_tag)
+    yield f"{'#' * int(title.tag[1:])} {get_tag_text(title, strip=True)}\n\n"
+
+
+def get_language(div: etree._Element) -> str:
+    """Get the language of the div tag."""
+    for cls in get_classes(div):
+        if re.match(r"(highlight|language)-\w+", cls):
+            return cls.split("-")[1]
+    return ""
+
+
+def get_code(pre: etree._Element) -> Generator[str, None, None]:
+    """Get the code of the pre tag."""
+    for a_tag in list(pre.iterdescendants("a")):
+        decompose(a_tag)
+    code = find(pre, "code")
+    if code is not None:  # code and doc
+        for child in iter_nodes(code):
+            if isinstance(child, tuple):
+                string, main = child
+                yield (string if main else "") + "\n"
+            else:
+                yield get_tag_text(child) + "\n"
+    # api reference, in ord to compatible to the dl dt dd structure
+    else:
+        for line in get_tag_text(pre).split("\n"):
+            yield line + "\n"
+
+
+def get_list(list_element: etree._Element, ordered: bool) -> Generator[str, None, None]:
+    """Get the list of the ul tag."""
+    for i, li in enumerate(child for child in list_element if child.tag == "li"):
+        prefix = f"{i + 1}. " if ordered else "- "
+        yield f"  {prefix}"
+        yield from get_text(li)
+        yield "\n\n"
+
+
+def get_description(dl: etree._Element) -> Generator[str, None, None]:
+    """Get the description of the dl tag."""
+    dt_tags = [child for child in dl if child.tag == "dt"]
+    dd_tags = [child for child in dl if child.tag == "dd"]
+
+    if len(dt_tags) == len(dd_tags):
+        for dt, dd in zip(dt_tags, dd_tags):
+            for a_tag in list(dt.iterdescendants("a")):
+                decompose(a_tag)
+            yield from get_text(dt)
+            yield "\n\n"
+            yield from get_text(dd)
+            yield "\n\n"
+    else:
+        for child in dl:
+            if not isinstance(child.tag, str) or child.tag == REMOVED:
+                continue
+            yield from get_text(child)
+            if child.tag in ("dt", "dd"):
+                yield "\nn"
+
+
+def get_table(table: etree._Element) -> Generator[str, None, None]:
+    """Get the markdown table of the table tag."""
+    thead = find(table, "thead")
+    if thead is not None:
+        headers = list(thead.iterdescendants("th"))
+        if headers:
+            yield "| "
+            yield " | ".join(get_tag_text(header) for header in headers)
+            yield " |\n"
+            yield "| "
+            yield " | ".join("----" for _ in headers)
+            yield " |\n"
+
+    tbody = find(table, "tbody")
+    if tbody is not None:
+        for row in tbody.iterdescendants("tr"):
+            yield "| "
+            yield " | ".join(
+                get_tag_text(cell, strip=True).replace("\n", " ")
+                for cell in row.iterdescendants("td")
+            )
+            yield " |\n"
+
+    yield "\n\n"
+
+
+def get_text(tag: Optional[etree._Element]) -> Generator[str, None, None]:
+    """Get the text of an article tag."""
+    if tag is None:
+        yield "None"
+        return
+    for child in iter_nodes(tag):
+        if isinstance(child, tuple):
+            yield child[0]
+            continue
+        name = child.tag
+        if name in HEADINGS:
+            yield from get_title(child)
+        elif name == "a":
+            yield f"[{get_tag_text(child)}]({child.get('href')})"
+        elif name == "img":
+            yield f"![{child.get('alt', '')}]({child.get('src')})"
+        elif name in ("strong", "b"):
+            yield f"**{get_tag_text(child)}**"
+        elif name in ("em", "i"):
+            yield get_tag_text(child)
+        elif name == "br":
+            yield "\n"
+        elif name == "pre":
+            parent = child.getparent()
+            grand_parent = parent.getparent() if parent is not None else None
+            language = get_language(grand_parent) if grand_parent is not None else ""
+            yield f"```{language}\n"
+            yield from get_code(child)
+            yield "\n```\n\n"
+        elif name == "p":
+            yield from get_text(child)
+            yield "\n\n"
+        elif name == "ul":
+            yield from get_list(child, False)
+        elif name == "ol":
+            yield from get_list(child, True)
+        elif name == "dl":
+            yield from get_description(child)
+        elif name == "div" and "dropdown" in get_classes(child):
+            yield get_tag_text(child)
+            yield "\n"
+        elif name == "div" and "tabs-container" in get_classes(child):
+            tabs = [li for li in child.iterdescendants("li") if li.get("role") == "tab"]
+            tab_panels = [
+                div for div in child.iterdescendants("div") if div.get("role") == "tabpanel"
+            ]
+            for tab, tab_panel in zip(tabs, tab_panels):
+                yield f"{get_tag_text(tab, strip=True)}\n"
+                yield from get_text(tab_panel)
+        elif name == "table":
+            yield from get_table(child)
+        else:
+            yield from get_text(child)
+
+
+def langchain_recursive_url_lxml_extractor(raw_html: Union[str, etree._Element, None]) -> str:
+    """Extract the text from the raw html, or from an already parsed page."""
+    root = parse_html(raw_html) if isinstance(raw_html, str) else raw_html
+    article_element = None
+    if root is not None:
+        # Remove all the tags that are not meaningful for the extraction.
+        for tag in list(root.iter(*SCAPE_TAGS)):
+            decompose(tag)
+        article_element = next(root.iter("article"), None)
+    article_markdown = "".join(get_text(article_element))
+    return re.sub(r"\n\n+", "\n\n", article_markdown).strip()
+
+
+def langchain_recursive_url_lxml_page_extractor(
+    raw_html: str, url: str, **kwargs
+) -> tuple[dict[str, Any], str]:
+    """Extract the metadata and the text of a page with the lxml engine."""
+    root = parse_html(raw_html)
+    metadata = {"source": url, "title": get_page_title(root, url), **kwargs}
+    return metadata, langchain_recursive_url_lxml_extractor(root)
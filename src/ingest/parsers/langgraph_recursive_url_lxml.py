@@ -0,0 +1,190 @@
+"""
+lxml engine of the langgraph recursive url parser.
+
+Walks the lxml tree directly instead of building a BeautifulSoup tree, and produces the
+same markdown as `langgraph_recursive_url_page_extractor`, see `lxml_tree` for how the
+helpers mirror bs4.
+"""
+# pylint: disable=wrong-import-position
+# pylint: disable=c-extension-no-member
+import os
+import sys
+import re
+from typing import Any, Callable, Generator, Optional, Union
+from lxml import etree
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
+from src.ingest.parsers.langgraph_recursive_url import SCAPE_TAGS
+from src.ingest.parsers.lxml_tree import (
+    HEADINGS,
+    decompose,
+    find,
+    find_children,
+    get_classes,
+    get_page_title,
+    get_tag_text,
+    iter_nodes,
+    parse_html,
+)
+
+
+def get_title(title: etree._Element) -> Generator[str, None, None]:
+    """Get the title of the tag."""
+    a_tag = find(title, "a")
+    if a_tag is not None:
+        decompose(a_tag)
+    yield f"{'#' * int(title.tag[1:])} {get_tag_text(title, strip=True)}\n\n"
+
+
+def get_list(
+    list_element: etree._Element,
+    ordered: bool,
+    nested_handler: Callable[[etree._Element], Generator[str, None, None]],
+) -> Generator[str, None, None]:
+    """Get the list from the list tag."""
+    for i, li in enumerate(find_children(list_element, "li")):
+        prefix = f"{i + 1}. " if ordered else "- "
+        yield prefix
+        yield from nested_handler(li)
+        yield "\n\n"
+
+
+def get_table(table: etree._Element) -> Generator[str, None, None]:
+    """Get the table from the table tag."""
+    thead = find(table, "thead")
+    if thead is not None:
+        headers = list(thead.iterdescendants("th"))
+        if headers:
+            yield "| " + " | ".join(get_tag_text(header) for header in headers) + " |\n"
+            yield "| " + " | ".join("----" for _ in headers) + " |\n"
+
+    tbody = find(table, "tbody")
+    if tbody is not None:
+        for row in tbody.iterdescendants("tr"):
+            yield "| " + " | ".join(
+                get_tag_text(cell, strip=True).replace("\n", " ")
+                for cell in row.iterdescendants("td")
+            ) + " |\n"
+
+
+def get_toc(nav: etree._Element, level: int = 0) -> Generator[str, None, None]:
+    """Get the table of contents from the nav tag."""
+    for child in iter_nodes(nav):
+        if isinstance(child, tuple):
+            continue
+        if child.tag == "label":
+            yield get_tag_text(child, strip=True)
+        elif child.tag == "ul":
+            for li in find_children(child, "li"):
+                a_tag = next(iter(find_children(li, "a")), None)
+                if a_tag is not None and a_tag.get("href"):
+                    title = get_tag_text(a_tag, strip=True)
+
+                    code = find(a_tag, "code")
+                    classes = get_classes(code) if code is not None else []
+                    prefix = ""
+                    if "doc-symbol-function" in classes:
+                        prefix = "func "
+                    elif "doc-symbol-class" in classes:
+                        prefix = "class "
+                    elif "doc-symbol-method" in classes:
+                        prefix = "meth "
+                    elif "doc-symbol-attribute" in classes:
+                        prefix = "attr "
+
+                    indent = "  " * level
+                    yield f"{indent}- [{prefix}{title}]({a_tag.get('href')})"
+                sub_nav = next(iter(find_children(li, "nav")), None)
+                if sub_nav is not None:
+                    yield from get_toc(sub_nav, level + 1)
+
+
+def get_language(pre: etree._Element) -> str:
+    """Get the language of the code in the pre tag from the classes of its parent."""
+    parent = pre.getparent()
+    if parent is None:
+        return ""
+    language = next(
+        filter(lambda x: re.match(r"language-\w+", x), get_classes(parent)), None
+    )
+    return "" if language is None else language.split("-")[1]
+
+
+def get_text(tag: etree._Element) -> Generator[str, None, None]:
+    """Get the text of an article tag."""
+    for child in iter_nodes(tag):
+        if isinstance(child, tuple):
+            yield child[0]
+            continue
+        name = child.tag
+        if name in HEADINGS:
+            yield from get_title(child)
+        elif name == "a":
+            yield f"[{get_tag_text(child)}]({child.get('href')})"
+        elif name == "img":
+            yield f"![{child.get('alt', '')}]({child.get('src')})"
+        elif name in ("strong", "b"):
+            yield f"**{get_tag_text(child)}**"
+        elif name in ("em", "i"):
+            yield f"_{get_tag_text(child)}_"
+        elif name == "br":
+            yield "\n"
+        elif name == "code":
+            parent = child.getparent()
+            if parent is not None and parent.tag == "pre":
+                language = get_language(parent)
+                yield f"```{language}\n{get_tag_text(child)}\n```\n\n"
+            else:
+                yield f"`{get_tag_text(child)}`"
+        elif name == "p":
+            yield from get_text(child)
+            yield "\n\n"
+        elif name == "ul":
+            yield from get_list(child, ordered=False, nested_handler=get_text)
+        elif name == "ol":
+            yield from get_list(child, ordered=True, nested_handler=get_text)
+        elif name == "div" and "tabs-container" in get_classes(child):
+            tabs = [li for li in child.iterdescendants("li") if li.get("role") == "tab"]
+            tab_panels = [
+                div for div in child.iterdescendants("div") if div.get("role") == "tabpanel"
+            ]
+            for tab, tab_panel in zip(tabs, tab_panels):
+                yield f"{get_tag_text(tab, strip=True)}\n"
+                yield from get_text(tab_panel)
+        elif name == "table":
+            yield from get_table(child)
+        elif name == "button":
+            continue
+        else:
+            yield from get_text(child)
+
+
+def langgraph_recursive_url_lxml_extractor(raw_html: Union[str, etree._Element, None]) -> str:
+    """Extract the text from the raw html, or from an already parsed page."""
+    root = parse_html(raw_html) if isinstance(raw_html, str) else raw_html
+    table_of_content = ""
+    article_content = ""
+    if root is not None:
+        # Remove all the tags that are not meaningful for the extraction.
+        for tag in list(root.iter(*SCAPE_TAGS)):
+            decompose(tag)
+        toc: Optional[etree._Element] = next(
+            (nav for nav in root.iter("nav") if nav.get("aria-label") == "Table of contents"),
+            None,
+        )
+        if toc is not None:
+            table_of_content = "\n".join(get_toc(toc))
+        article_element = next(root.iter("article"), None)
+        if article_element is not None:
+            article_content = "".join(get_text(article_element))
+    md_content = f"{table_of_content}\n\n{article_content}"
+    return re.sub(r"\n\n+", "\n\n", md_content).strip()
+
+
+def langgraph_recursive_url_lxml_page_extractor(
+    raw_html: str, url: str, **kwargs
+) -> tuple[dict[str, Any], str]:
+    """Extract the metadata and the text of a page with the lxml engine."""
+    root = parse_html(raw_html)
+    metadata = {"source": url, "title": get_page_title(root, url, "title"), **kwargs}
+    return metadata, langgraph_recursive_url_lxml_extractor(root)
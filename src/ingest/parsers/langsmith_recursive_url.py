@@ -9,13 +9,14 @@ Parser for the langsmith recursive url.
 import os
 import sys
 import re
-from typing import Generator, Optional, Union, Literal
+from typing import Any, Generator, Optional, Union, Literal
 import requests
 import aiohttp
 from bs4 import BeautifulSoup
 from bs4.element import Doctype, NavigableString, Tag, AttributeValueList
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
+from src.ingest.parsers.basic_recursive_url import get_page_title
 
 
 def langsmith_recursive_url_metadata_extractor(
@@ -26,17 +27,9 @@ def langsmith_recursive_url_metadata_extractor(
 ) -> dict:
     """Extract metadata from the langsmith recursive url."""
     soup = BeautifulSoup(raw_html, "lxml")
-    title_element = soup.find("title")
-    try:
-        title_element.find("a").decompose() # type: ignore
-    except AttributeError:
-        pass
-    title = (
-        title_element.get_text() if title_element else url.rstrip("/").split("/")[-1]
-    )
     return {
         "source": url,
-        "title": title,
+        "title": get_page_title(soup, url, "title"),
         **kwargs,
     }
 
@@ -178,6 +171,15 @@ def langsmith_recursive_url_extractor(soup: BeautifulSoup) -> str:
     return re.sub(r"\n\n+", "\n\n", article_content).strip()
 
 
+def langsmith_recursive_url_page_extractor(
+    raw_html: str, url: str, **kwargs
+) -> tuple[dict[str, Any], str]:
+    """Extract the metadata and the text of a page, parsing the raw html only once."""
+    soup = BeautifulSoup(raw_html, "lxml")
+    metadata = {"source": url, "title": get_page_title(soup, url, "title"), **kwargs}
+    return metadata, langsmith_recursive_url_extractor(soup)
+
+
 if __name__ == "__main__":
     from rich.console import Console
     from rich.markdown import Markdown
@@ -0,0 +1,137 @@
+"""
+lxml tree helpers of the lxml extractor engines.
+
+The lxml engines walk the lxml tree directly instead of building a BeautifulSoup tree,
+and produce the same markdown as the bs4 parsers. To stay byte-identical the helpers
+mirror what bs4 does on top of lxml:
+    - every text node is a separate string, whitespace-only strings outside `pre` and
+      `textarea` are collapsed to a newline or a space;
+    - strings under `script`, `style`, `template`, `rt` and `rp` are left out of the text
+      of the other tags, comments are only kept when iterating the children;
+    - a removed tag leaves the strings around it apart, so it is replaced by an empty
+      placeholder instead of merging its tail into the previous string.
+"""
+# pylint: disable=c-extension-no-member
+from typing import Iterator, Optional, Union
+from lxml import etree
+
+Node = Union[etree._Element, tuple[str, bool]]  # a tag, or a string and if it is main content
+
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+REMOVED = "chat-with-x-removed"
+
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+_STRING_CONTAINERS = {"rt", "rp", "style", "script", "template"}
+
+
+def parse_html(raw_html: str) -> Optional[etree._Element]:
+    """Parse the raw html like the bs4 lxml tree builder, None for an empty document."""
+    parser = etree.HTMLParser(recover=True)
+    parser.feed(raw_html)
+    return parser.close()
+
+
+def _context(tag: etree._Element) -> tuple[Optional[str], bool]:
+    """Get the string container and if the whitespace is preserved inside a tag."""
+    container = None
+    preserve = False
+    node: Optional[etree._Element] = tag
+    while node is not None:
+        if container is None and node.tag in _STRING_CONTAINERS:
+            container = node.tag
+        if node.tag in _PRESERVE_WHITESPACE_TAGS:
+            preserve = True
+        node = node.getparent()
+    return container, preserve
+
+
+def _normalize(text: str, preserve: bool) -> str:
+    """Collapse a whitespace-only string, like bs4 does when parsing."""
+    if not preserve and not text.strip(_ASCII_SPACES):
+        return "\n" if "\n" in text else " "
+    return text
+
+
+def iter_nodes(tag: etree._Element) -> Iterator[Node]:
+    """Iterate the children of a tag, strings included."""
+    container, preserve = _context(tag)
+    main = container is None
+    if tag.text:
+        yield _normalize(tag.text, preserve), main
+    for child in tag:
+        if child.tag is etree.Comment:
+            yield _normalize(child.text or "", preserve), False
+        elif isinstance(child.tag, str) and child.tag != REMOVED:
+            yield child
+        if child.tail:
+            yield _normalize(child.tail, preserve), main
+
+
+def iter_strings(
+    tag: etree._Element, strip: bool = False, skip: Optional[etree._Element] = None
+) -> Iterator[str]:
+    """Iterate the strings of a tag like bs4 `_all_strings`, leaving out `skip`."""
+    container, preserve = _context(tag)
+    wanted = tag.tag if tag.tag in _STRING_CONTAINERS else None
+
+    def walk(node: etree._Element, container: Optional[str], preserve: bool) -> Iterator[str]:
+        if node.text and container == wanted:
+            yield _normalize(node.text, preserve)
+        for child in node:
+            if isinstance(child.tag, str) and child is not skip:
+                yield from walk(
+                    child,
+                    child.tag if child.tag in _STRING_CONTAINERS else container,
+                    preserve or child.tag in _PRESERVE_WHITESPACE_TAGS,
+                )
+            if child.tail and container == wanted:
+                yield _normalize(child.tail, preserve)
+
+    for string in walk(tag, container, preserve):
+        if strip:
+            string = string.strip()
+            if not string:
+                continue
+        yield string
+
+
+def get_tag_text(tag: etree._Element, strip: bool = False) -> str:
+    """Get the text of a tag like bs4 `get_text`."""
+    return "".join(iter_strings(tag, strip=strip))
+
+
+def decompose(tag: etree._Element):
+    """Remove a tag and its content, keeping the strings around it apart."""
+    parent = tag.getparent()
+    if parent is None:
+        return
+    placeholder = etree.Element(REMOVED)
+    placeholder.tail = tag.tail
+    parent.replace(tag, placeholder)
+
+
+def find(tag: etree._Element, name: str) -> Optional[etree._Element]:
+    """Find the first descendant with the given name."""
+    return next(tag.iterdescendants(name), None)
+
+
+def find_children(tag: etree._Element, name: str) -> list[etree._Element]:
+    """Find the children with the given name."""
+    return [child for child in tag if child.tag == name]
+
+
+def get_classes(tag: etree._Element) -> list[str]:
+    """Get the classes of a tag."""
+    return (tag.get("class") or "").split()
+
+
+def get_page_title(root: Optional[etree._Element], url: str, tag: str = "h1") -> str:
+    """Get the title of the page from `tag` without its anchor link.
+
+    Falls back to the last part of the url when the page has no such tag.
+    """
+    title_element = None if root is None else next(root.iter(tag), None)
+    if title_element is None:
+        return url.rstrip("/").split("/")[-1]
+    return "".join(iter_strings(title_element, skip=find(title_element, "a")))
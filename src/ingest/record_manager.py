@@ -6,6 +6,8 @@ import os
 import sys
 from typing import Literal
 from langchain.indexes import SQLRecordManager
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 from src.utils import get_record_db_url
@@ -25,6 +27,69 @@ def get_record_manager(
     )
 
 
+def get_ingest_version(
+    vector_provider: Literal["chroma", "supabase", "weaviate", "duck"],
+    collection_name: str,
+    embedding_name: str,
+) -> str:
+    """Get the version of a collection's ingested content, it changes after every ingest."""
+    record_manager = get_record_manager(vector_provider, collection_name, embedding_name)
+    try:
+        with record_manager.engine.connect() as conn:
+            count, updated_at = conn.execute(
+                text(
+                    "SELECT COUNT(*), MAX(updated_at) FROM upsertion_record "
+                    "WHERE namespace = :namespace"
+                ),
+                {"namespace": record_manager.namespace},
+            ).one()
+    except OperationalError:  # nothing has been ingested yet
+        return ""
+    return f"{count}:{updated_at or 0}"
+
+
+def get_group_timestamps(record_manager: SQLRecordManager) -> dict[str, float]:
+    """Get when the documents of each group, e.g. each source url, were last indexed."""
+    with record_manager.engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT group_id, MAX(updated_at) FROM upsertion_record "
+                "WHERE namespace = :namespace AND group_id IS NOT NULL GROUP BY group_id"
+            ),
+            {"namespace": record_manager.namespace},
+        )
+        return {group_id: updated_at for group_id, updated_at in rows}
+
+
+def refresh_groups(record_manager: SQLRecordManager, group_ids: list[str]) -> set[str]:
+    """Mark the records of the given groups as indexed now, return the groups with records.
+
+    The documents of a refreshed group survive the cleanup of the current ingest without
+    being split and indexed again.
+    """
+    found: set[str] = set()
+    if not group_ids:
+        return found
+    now = record_manager.get_time()
+    params = {"namespace": record_manager.namespace, "now": now}
+    select = text(
+        "SELECT DISTINCT group_id FROM upsertion_record "
+        "WHERE namespace = :namespace AND group_id IN :group_ids"
+    ).bindparams(bindparam("group_ids", expanding=True))
+    update = text(
+        "UPDATE upsertion_record SET updated_at = :now "
+        "WHERE namespace = :namespace AND group_id IN :group_ids"
+    ).bindparams(bindparam("group_ids", expanding=True))
+    with record_manager.engine.begin() as conn:
+        # stay below SQLite's limit on the number of host parameters
+        for i in range(0, len(group_ids), 500):
+            batch = {**params, "group_ids": group_ids[i : i + 500]}
+            found.update(row[0] for row in conn.execute(select, batch))
+            conn.execute(update, batch)
+    return found
+
+
 if __name__ == "__main__":
     print(get_record_db_url())
     print(get_record_manager("chroma", "test_collection", "text-embedding-3-small"))
+    print(get_ingest_version("chroma", "langchain", "openai/text-embedding-3-small"))
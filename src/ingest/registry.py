@@ -0,0 +1,233 @@
+"""
+Registry of the collections to ingest and of the site parsers extracting their pages.
+
+The collections are declared in `data/metadata.json`, each one names the site parser of
+its pages in `source`. Adding a site only needs a new entry there, sites without a
+registered parser use the basic extraction until one is added with `register_site_parser`.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import re
+import json
+from typing import Any, Literal, NamedTuple, Optional
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from src.configuration import IngestConfig
+from src.utils import get_metadata_path
+from src.ingest.extraction import PageExtractorFn, combine_extractors
+from src.ingest.parsers.basic_recursive_url import (
+    recursive_url_metadata_extractor,
+    recursive_url_extractor,
+)
+from src.ingest.parsers.langchain_recursive_url import (
+    langchain_recursive_url_page_extractor,
+    exclude_urls_doc,
+    exclude_urls_ref,
+    exclude_urls_code,
+)
+from src.ingest.parsers.langchain_recursive_url_lxml import (
+    langchain_recursive_url_lxml_page_extractor,
+)
+from src.ingest.parsers.langgraph_recursive_url import langgraph_recursive_url_page_extractor
+from src.ingest.parsers.langgraph_recursive_url_lxml import (
+    langgraph_recursive_url_lxml_page_extractor,
+)
+from src.ingest.parsers.langsmith_recursive_url import langsmith_recursive_url_page_extractor
+from src.ingest.parsers.langsmith_recursive_url_lxml import (
+    langsmith_recursive_url_lxml_page_extractor,
+)
+
+
+class SiteParser(NamedTuple):
+    """How the pages of a site are extracted."""
+
+    engines: dict[str, PageExtractorFn]
+    """The page extractors by engine name, the first one is the default."""
+    exclude_urls: dict[str, list[str]] = {}
+    """The urls always excluded from the crawl, by source key (`doc`, `ref` or `code`)."""
+
+
+class CrawlSource(NamedTuple):
+    """A part of a site to crawl, and how to extract its pages."""
+
+    name: str
+    path: str
+    filter_urls: list[str]
+    meta_kwargs: dict[str, Any]
+    max_depth: int
+    page_extractor: PageExtractorFn
+    sitemap: Optional[str] = None
+
+    def in_scope(self, url: str) -> bool:
+        """Check if a url belongs to the source."""
+        return url.startswith(self.path) and not any(
+            url.startswith(prefix) for prefix in self.filter_urls
+        )
+
+
+BASIC_SITE_PARSER = SiteParser(
+    engines={"bs4": combine_extractors(recursive_url_metadata_extractor, recursive_url_extractor)}
+)
+
+_site_parsers: dict[str, SiteParser] = {}
+
+
+def register_site_parser(source: str, parser: SiteParser):
+    """Register the parser of the collections whose metadata `source` is `source`."""
+    _site_parsers[source] = parser
+
+
+def get_site_parser(source: str) -> SiteParser:
+    """Get the parser of a source, the basic one if none is registered."""
+    return _site_parsers.get(source, BASIC_SITE_PARSER)
+
+
+register_site_parser(
+    "langchain",
+    SiteParser(
+        engines={
+            "lxml": langchain_recursive_url_lxml_page_extractor,
+            "bs4": langchain_recursive_url_page_extractor,
+        },
+        exclude_urls={"doc": exclude_urls_doc, "ref": exclude_urls_ref, "code": exclude_urls_code},
+    ),
+)
+register_site_parser(
+    "langgraph",
+    SiteParser(
+        engines={
+            "lxml": langgraph_recursive_url_lxml_page_extractor,
+            "bs4": langgraph_recursive_url_page_extractor,
+        }
+    ),
+)
+register_site_parser(
+    "langsmith",
+    SiteParser(
+        engines={
+            "lxml": langsmith_recursive_url_lxml_page_extractor,
+            "bs4": langsmith_recursive_url_page_extractor,
+        }
+    ),
+)
+
+
+class SourceSpec(BaseModel):
+    """A part of a site to crawl, an entry of `includes` in the metadata."""
+
+    type: str = Field(description="The kind of pages, e.g. `documents` or `api_reference`.")
+    url: str = Field(description="The url the crawl starts from.")
+    exclude: list[str] = Field(default_factory=list, description="The url prefixes not to crawl.")
+    lang: str = Field(default="python", description="The programming language of the pages.")
+    max_depth: int = Field(default=4, ge=1, description="The maximum depth of the crawl.")
+    engine: Optional[str] = Field(
+        default=None, description="The extractor engine, the parser's default if not set."
+    )
+    sitemap: Optional[str] = Field(
+        default=None,
+        description=(
+            "The sitemap of the pages, the `incremental` ingest mode fetches its urls under "
+            "`url` instead of crawling and deletes the pages missing from it."
+        ),
+    )
+
+
+class CollectionSpec(BaseModel):
+    """A collection to ingest, an entry of the metadata."""
+
+    name: str = Field(description="The name of the collection.")
+    description: str = Field(default="", description="What the collection is about.")
+    source: str = Field(description="The site parser of the pages, see `register_site_parser`.")
+    includes: list[dict[Literal["doc", "ref", "code"], SourceSpec]] = Field(
+        description="The parts of the site to crawl, keyed by the `doc_type` of their pages."
+    )
+    provider: Literal["chroma", "weaviate", "duck", "supabase"] = Field(default="chroma")
+    embedding_model: str = Field(default="openai/text-embedding-3-small")
+    chunk_size: int = Field(default=1000, description="The maximum number of tokens in a chunk.")
+    chunk_overlap: int = Field(default=50, description="The number of tokens shared by chunks.")
+    parent_chunk_size: Optional[int] = Field(
+        default=None, ge=0, description="Overrides the size of the parent sections."
+    )
+    text_splitter: Optional[Literal["markdown", "recursive"]] = Field(
+        default=None, description="Overrides how the extracted pages are split."
+    )
+    max_concurrent_sources: Optional[int] = Field(
+        default=None, ge=1, description="Overrides the number of sources crawled at once."
+    )
+    max_connections: Optional[int] = Field(
+        default=None, ge=1, description="Overrides the size of the connection pool of the site."
+    )
+    requests_per_second: Optional[float] = Field(
+        default=None, description="Overrides the rate limit of the requests to the site."
+    )
+
+    @property
+    def collection_name(self) -> str:
+        """The name of the vector store collection, restricted to the allowed characters."""
+        return re.sub(r"[^A-Za-z0-9._-]+", "-", self.name.strip())
+
+    def ingest_config(self, config: IngestConfig) -> IngestConfig:
+        """Get the ingest configuration of the collection, based on `config`."""
+        update: dict[str, Any] = {
+            "retriever_provider": self.provider,
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+        }
+        for key in (
+            "text_splitter",
+            "parent_chunk_size",
+            "max_concurrent_sources",
+            "max_connections",
+            "requests_per_second",
+        ):
+            if getattr(self, key) is not None:
+                update[key] = getattr(self, key)
+        return config.model_copy(update=update)
+
+    def crawl_sources(self) -> list[CrawlSource]:
+        """Get the sources to crawl, with the extractor of the site parser."""
+        parser = get_site_parser(self.source)
+        sources = []
+        for include in self.includes:
+            for doc_type, spec in include.items():
+                engine = spec.engine or next(iter(parser.engines))
+                if engine not in parser.engines:
+                    raise ValueError(f"Unsupported engine for {self.source}: {engine}")
+                sources.append(
+                    CrawlSource(
+                        name=spec.type,
+                        path=spec.url,
+                        filter_urls=list(
+                            dict.fromkeys([*spec.exclude, *parser.exclude_urls.get(doc_type, [])])
+                        ),
+                        meta_kwargs={"doc_type": doc_type, "lang": spec.lang},
+                        max_depth=spec.max_depth,
+                        page_extractor=parser.engines[engine],
+                        sitemap=spec.sitemap,
+                    )
+                )
+        return sources
+
+
+def load_collection_specs(path: Optional[str] = None) -> list[CollectionSpec]:
+    """Load the collections declared in the metadata file."""
+    with open(path or get_metadata_path(), encoding="utf-8") as f:
+        return [CollectionSpec.model_validate(entry) for entry in json.load(f)]
+
+
+def get_collection_spec(name: str, path: Optional[str] = None) -> CollectionSpec:
+    """Get a collection declared in the metadata file by name or collection name."""
+    for spec in load_collection_specs(path):
+        if name in (spec.name, spec.collection_name):
+            return spec
+    raise ValueError(f"Unknown collection: {name}")
+
+
+if __name__ == "__main__":
+    for collection_spec in load_collection_specs():
+        print(collection_spec.collection_name, collection_spec.source)
+        for crawl_source in collection_spec.crawl_sources():
+            print(f"  {crawl_source.name}: {crawl_source.path} {crawl_source.meta_kwargs}")
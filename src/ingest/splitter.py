@@ -0,0 +1,405 @@
+"""
+Text splitters of the ingestion.
+
+`MarkdownStructureSplitter` splits the markdown produced by the page extractors along its
+structure: the chunks follow the heading hierarchy, fenced code blocks and tables are only
+split between lines (the pieces are fenced again or keep the table header), and a label or
+an API signature stays with the block it introduces. The chunks are measured in tokens and
+carry the path of their headings in the `headings` metadata.
+
+The splitters record the offset of each chunk in its page in the `start_index` metadata.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import re
+from typing import Any, Iterable, Literal, NamedTuple, Optional
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from src.utils import count_tokens
+
+_HEADING = re.compile(r"^(#{1,6}) (.*)$")
+_FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+_TABLE_SEPARATOR = re.compile(r"^\|[\s|:-]+\|$")
+# `name(args) -> type`, `name(args) →` or `class module.Name`, as rendered from the `dt` tags
+_SIGNATURE = re.compile(r"^(class |async )?[\w.]+\(.*\)\s*((->|→).*)?$|^class [\w.]+$|→\s*$")
+
+
+class Block(NamedTuple):
+    """A unit of markdown that is only split when it does not fit in a chunk."""
+
+    kind: Literal["heading", "code", "table", "text"]
+    text: str
+    level: int = 0
+    prefix: str = ""
+    """The label or API signature introducing the block, kept with its first part."""
+    start: int = 0
+    """The offset of the text of the block in the page."""
+    prefix_start: int = 0
+    """The offset of the prefix in the page."""
+
+    @property
+    def full_text(self) -> str:
+        """The block with its prefix."""
+        return f"{self.prefix}\n\n{self.text}" if self.prefix else self.text
+
+    @property
+    def full_start(self) -> int:
+        """The offset of the block with its prefix in the page."""
+        return self.prefix_start if self.prefix else self.start
+
+    def page_offset(self, index: int) -> int:
+        """Get the offset in the page of a position in the full text of the block."""
+        if not self.prefix:
+            return self.start + index
+        if index < len(self.prefix) + 2:
+            return self.prefix_start + index
+        return self.start + index - len(self.prefix) - 2
+
+
+def parse_blocks(text: str) -> list[Block]:
+    """Parse markdown into headings, fenced code blocks, tables and paragraphs."""
+    blocks: list[Block] = []
+    paragraph: list[str] = []
+    paragraph_start = 0
+
+    def flush():
+        if paragraph:
+            blocks.append(Block("text", "\n".join(paragraph), start=paragraph_start))
+            paragraph.clear()
+
+    lines = text.split("\n")
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if fence := _FENCE.match(line):
+            flush()
+            marker = fence.group(1)
+            j = i + 1
+            while j < len(lines) and lines[j].strip() != marker:
+                j += 1
+            blocks.append(Block("code", "\n".join(lines[i : j + 1]), start=offsets[i]))
+            i = j + 1
+        elif heading := _HEADING.match(line):
+            flush()
+            blocks.append(Block("heading", line, len(heading.group(1)), start=offsets[i]))
+            i += 1
+        elif line.startswith("|"):
+            flush()
+            j = i
+            while j < len(lines) and lines[j].startswith("|"):
+                j += 1
+            blocks.append(Block("table", "\n".join(lines[i:j]), start=offsets[i]))
+            i = j
+        else:
+            if line.strip():
+                if not paragraph:
+                    paragraph_start = offsets[i]
+                paragraph.append(line)
+            else:
+                flush()
+            i += 1
+    flush()
+    return _glue(blocks)
+
+
+def _glue(blocks: list[Block]) -> list[Block]:
+    """Join a label (`Parameters:`) or an API signature with the block it introduces."""
+    glued: list[Block] = []
+    for block in blocks:
+        previous = glued[-1] if glued else None
+        if (
+            previous is not None
+            and previous.kind == "text"
+            and block.kind != "heading"
+            and "\n" not in previous.text
+            and (previous.text.rstrip().endswith(":") or _SIGNATURE.search(previous.text.strip()))
+        ):
+            glued[-1] = block._replace(
+                prefix=previous.full_text, prefix_start=previous.full_start
+            )
+        else:
+            glued.append(block)
+    return glued
+
+
+class _Piece(NamedTuple):
+    """A block, or a part of a block too large for a chunk, with its token count."""
+
+    text: str
+    tokens: int
+    path: tuple[str, ...]
+    start: int
+    """The offset of the piece in the page."""
+
+
+class MarkdownStructureSplitter(TextSplitter):
+    """Split the markdown of the extracted pages along its structure, measured in tokens.
+
+    Consecutive sections are merged while they fit in a chunk, a section too large for a
+    chunk is split between its blocks and its chunks overlap by whole blocks.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 50, **kwargs: Any):
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=count_tokens,
+            **kwargs,
+        )
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            length_function=count_tokens,
+            add_start_index=True,
+        )
+
+    def _sections(self, text: str) -> list[list[_Piece]]:
+        """Group the blocks by section, each block with the path of its headings."""
+        sections: list[list[_Piece]] = []
+        path: list[tuple[int, str]] = []
+        for block in parse_blocks(text):
+            if block.kind == "heading" or not sections:
+                if block.kind == "heading":
+                    while path and path[-1][0] >= block.level:
+                        path.pop()
+                    path.append((block.level, _HEADING.sub(r"\2", block.text).strip()))
+                sections.append([])
+            sections[-1].extend(
+                self._pieces(block, tuple(title for _, title in path))
+            )
+        return [section for section in sections if section]
+
+    def _pieces(self, block: Block, path: tuple[str, ...]) -> list[_Piece]:
+        """Split a block too large for a chunk, code between lines and tables between rows.
+
+        The fences, or the table header, are detected on the block without its prefix and
+        repeated in each piece, the prefix is only kept in the first piece.
+        """
+        text = block.full_text
+        tokens = count_tokens(text)
+        if tokens <= self._chunk_size:
+            return [_Piece(text, tokens, path, block.full_start)]
+        lines = block.text.split("\n")
+        fence = _FENCE.match(lines[0]) if block.kind == "code" else None
+        if fence is not None and len(lines) > 1:
+            marker = fence.group(1)
+            # an unclosed fence is closed in each piece, its last line is code
+            closed = len(lines) > 2 and lines[-1].strip() == marker
+            head, body, tail = [lines[0]], lines[1:-1] if closed else lines[1:], [marker]
+        elif block.kind == "table" and len(lines) > 2 and _TABLE_SEPARATOR.match(lines[1]):
+            head, body, tail = lines[:2], lines[2:], []
+        else:
+            return [
+                _Piece(
+                    doc.page_content,
+                    count_tokens(doc.page_content),
+                    path,
+                    block.page_offset(doc.metadata["start_index"]),
+                )
+                for doc in self._fallback.create_documents([text])
+            ]
+        budget = self._chunk_size - count_tokens("\n".join(head + tail))
+        prefix_tokens = count_tokens(block.prefix) + 2 if block.prefix else 0
+        if prefix_tokens > budget // 2:
+            # a prefix taking most of a chunk is split on its own
+            return [
+                *self._pieces(Block("text", block.prefix, start=block.prefix_start), path),
+                *self._pieces(block._replace(prefix=""), path),
+            ]
+        body_start = block.start + len("\n".join(head)) + 1
+        pieces: list[_Piece] = []
+        for offset, part in self._pack_lines(body, budget, first_budget=budget - prefix_tokens):
+            piece = "\n".join(head + part + tail)
+            # the first piece starts with the block, the others with their first line
+            start = block.full_start if not pieces else body_start + offset
+            if not pieces and block.prefix:
+                piece = f"{block.prefix}\n\n{piece}"
+            pieces.append(_Piece(piece, count_tokens(piece), path, start))
+        return pieces
+
+    def _pack_lines(
+        self, lines: list[str], budget: int, first_budget: Optional[int] = None
+    ) -> Iterable[tuple[int, list[str]]]:
+        """Pack lines in parts of at most `budget` tokens, splitting the longer lines.
+
+        The first part is limited to `first_budget` tokens when given. Each part comes with
+        its offset in the joined lines.
+        """
+        limit = budget if first_budget is None else first_budget
+        part: list[str] = []
+        part_start = 0
+        tokens = 0
+        offset = 0
+        for line in lines:
+            line_tokens = count_tokens(line) + 1
+            if part and tokens + line_tokens > limit:
+                yield part_start, part
+                part, tokens, limit = [], 0, budget
+            if line_tokens > limit:
+                splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=max(limit - 1, 1),
+                    chunk_overlap=0,
+                    length_function=count_tokens,
+                    add_start_index=True,
+                )
+                for doc in splitter.create_documents([line]):
+                    yield offset + doc.metadata["start_index"], [doc.page_content]
+                    limit = budget
+            else:
+                if not part:
+                    part_start = offset
+                part.append(line)
+                tokens += line_tokens
+            offset += len(line) + 1
+        if part:
+            yield part_start, part
+
+    def _chunks(self, text: str) -> list[tuple[str, tuple[str, ...], int]]:
+        """Split a text into chunks, each with the common path of its headings and its offset."""
+        chunks: list[list[_Piece]] = []
+        current: list[_Piece] = []
+        tokens = 0
+
+        def emit():
+            nonlocal current, tokens
+            if current:
+                chunks.append(current)
+            current, tokens = [], 0
+
+        for section in self._sections(text):
+            section_tokens = sum(piece.tokens + 1 for piece in section)
+            if current and tokens + section_tokens > self._chunk_size:
+                emit()
+            if section_tokens <= self._chunk_size:
+                current.extend(section)
+                tokens += section_tokens
+                continue
+            for piece in section:
+                if current and tokens + piece.tokens + 1 > self._chunk_size:
+                    overlap = self._overlap(current, piece)
+                    emit()
+                    current, tokens = overlap, sum(p.tokens + 1 for p in overlap)
+                current.append(piece)
+                tokens += piece.tokens + 1
+        emit()
+        return [
+            ("\n\n".join(piece.text for piece in chunk), _common_path(chunk), chunk[0].start)
+            for chunk in chunks
+        ]
+
+    def _overlap(self, chunk: list[_Piece], piece: _Piece) -> list[_Piece]:
+        """Get the last pieces of a chunk of the same section to repeat in the next chunk."""
+        overlap: list[_Piece] = []
+        tokens = 0
+        for previous in reversed(chunk):
+            tokens += previous.tokens + 1
+            if (
+                previous.path != piece.path
+                or tokens > self._chunk_overlap
+                or tokens + piece.tokens + 1 > self._chunk_size
+            ):
+                break
+            overlap.insert(0, previous)
+        return overlap
+
+    def split_text(self, text: str) -> list[str]:
+        """Split a text into chunks."""
+        return [chunk for chunk, _, _ in self._chunks(text)]
+
+    def create_documents(
+        self, texts: list[str], metadatas: Optional[list[dict[Any, Any]]] = None
+    ) -> list[Document]:
+        """Split the texts into documents, with the path of their headings in `headings`."""
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            for chunk, path, start in self._chunks(text):
+                chunk_metadata = dict(metadata)
+                if self._add_start_index:
+                    chunk_metadata["start_index"] = start
+                if path:
+                    chunk_metadata["headings"] = " > ".join(path)
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+
+class RecursiveTokenTextSplitter(RecursiveCharacterTextSplitter):
+    """Recursive splitter measured in tokens.
+
+    `TextSplitter` looks for the next chunk `chunk_overlap` characters before the end of
+    the previous one, which misses it when the overlap is counted in tokens, so the
+    `start_index` of the chunks is searched from the start of the previous chunk instead.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 50, **kwargs: Any):
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=count_tokens,
+            **kwargs,
+        )
+
+    def create_documents(
+        self, texts: list[str], metadatas: Optional[list[dict[Any, Any]]] = None
+    ) -> list[Document]:
+        """Split the texts into documents, with the offset of each chunk in `start_index`."""
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            index = -1
+            for chunk in self.split_text(text):
+                chunk_metadata = dict(metadata)
+                if self._add_start_index:
+                    index = text.find(chunk, index + 1)
+                    chunk_metadata["start_index"] = index
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+
+def _common_path(pieces: list[_Piece]) -> tuple[str, ...]:
+    """Get the longest path of headings shared by the pieces of a chunk."""
+    path = pieces[0].path
+    for piece in pieces[1:]:
+        i = 0
+        while i < min(len(path), len(piece.path)) and path[i] == piece.path[i]:
+            i += 1
+        path = path[:i]
+    return path
+
+
+def get_text_splitter(
+    name: Literal["markdown", "recursive"], chunk_size: int, chunk_overlap: int
+) -> TextSplitter:
+    """Get a text splitter measuring its chunks in tokens and recording their `start_index`."""
+    match name:
+        case "markdown":
+            return MarkdownStructureSplitter(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+            )
+        case "recursive":
+            return RecursiveTokenTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+            )
+        case _:
+            raise ValueError(f"Unsupported text splitter: {name}")
+
+
+if __name__ == "__main__":
+    golden_dir = os.path.join(os.path.dirname(__file__), "../test/golden/langchain")
+    for file_name in sorted(os.listdir(golden_dir)):
+        if not file_name.endswith(".md"):
+            continue
+        with open(os.path.join(golden_dir, file_name), encoding="utf-8") as f:
+            page = f.read()
+        for splitter_name in ("markdown", "recursive"):
+            splitter = get_text_splitter(splitter_name, chunk_size=200, chunk_overlap=20)
+            docs = splitter.create_documents([page])
+            print(file_name, splitter_name, [count_tokens(doc.page_content) for doc in docs])
+            for doc in docs if splitter_name == "markdown" else []:
+                print("   ", doc.metadata.get("headings"), repr(doc.page_content[:60]))
@@ -0,0 +1,179 @@
+"""
+Lexical (BM25) index of the ingested collections, used next to the vector store.
+
+The index is built from the vector store content at ingest time and saved on disk,
+so hybrid retrieval can match exact identifiers like `ChatDeepSeek` that embedding
+search tends to miss.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import math
+import heapq
+import pickle
+from collections import Counter
+from typing import Any, Literal, Optional
+from langchain_chroma import Chroma
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.cache import LRUCache
+from src.rerank import tokenize
+from src.utils import get_lexical_db_dir
+
+_indexes: LRUCache["LexicalIndex"] = LRUCache(maxsize=16)
+
+
+def match_where(metadata: dict[str, Any], where: Optional[dict[str, Any]]) -> bool:
+    """Check if a metadata matches a Chroma `where` filter.
+
+    Supports equality, `$eq`, `$ne`, `$in`, `$nin`, `$and` and `$or`.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LexicalIndex:
+    """Inverted index scored with BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: list[str] = []
+        self.metadatas: list[dict[str, Any]] = []
+        self.lengths: list[int] = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+
+    @classmethod
+    def build(
+        cls, ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]
+    ) -> "LexicalIndex":
+        """Build the index of the given documents."""
+        index = cls()
+        for position, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            terms = tokenize(text)
+            index.ids.append(doc_id)
+            index.metadatas.append(metadata or {})
+            index.lengths.append(len(terms))
+            for term, freq in Counter(terms).items():
+                index.postings.setdefault(term, []).append((position, freq))
+        return index
+
+    def search(
+        self, query: str, k: int = 4, where: Optional[dict[str, Any]] = None
+    ) -> list[tuple[str, float]]:
+        """Get the ids and BM25 scores of the best k documents matching the query."""
+        n = len(self.ids)
+        if n == 0:
+            return []
+        avg_length = sum(self.lengths) / n or 1
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / avg_length)
+                scores[position] = (
+                    scores.get(position, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+                )
+        if where:
+            scores = {
+                position: score
+                for position, score in scores.items()
+                if match_where(self.metadatas[position], where)
+            }
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ids[position], score) for position, score in best]
+
+    def save(self, path: str):
+        """Save the index to a file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """Load an index from a file."""
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def get_lexical_index_path(
+    provider: Literal["chroma", "duck", "weaviate", "supabase"], collection_name: str
+) -> str:
+    """Get the path of a collection's lexical index."""
+    return os.path.join(get_lexical_db_dir(provider), f"{collection_name}.pkl")
+
+
+def build_lexical_index(
+    store: Chroma,
+    provider: Literal["chroma", "duck", "weaviate", "supabase"],
+    collection_name: str,
+    batch_size: int = 5000,
+) -> LexicalIndex:
+    """Build the lexical index of a collection from the vector store content and save it."""
+    ids: list[str] = []
+    texts: list[str] = []
+    metadatas: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        batch = store.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        ids.extend(batch["ids"])
+        texts.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        offset += len(batch["ids"])
+    index = LexicalIndex.build(ids, texts, metadatas)
+    index.save(get_lexical_index_path(provider, collection_name))
+    return index
+
+
+def load_lexical_index(
+    provider: Literal["chroma", "duck", "weaviate", "supabase"], collection_name: str
+) -> Optional[LexicalIndex]:
+    """Load a collection's lexical index, None if it was never built.
+
+    Loaded indexes are cached until the file is rebuilt.
+    """
+    path = get_lexical_index_path(provider, collection_name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    index = _indexes.get((path, mtime))
+    if index is None:
+        index = LexicalIndex.load(path)
+        _indexes.set((path, mtime), index)
+    return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse several rankings of ids, each id scores the sum of 1 / (k + rank)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
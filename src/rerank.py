@@ -0,0 +1,127 @@
+"""
+Rerankers for the retrieved documents.
+
+Functions:
+    tokenize: Split a text into lowercase lexical terms, identifiers are also split into parts.
+    bm25_rerank: Rank the documents by their BM25 score against the query.
+    get_reranker: Get a reranker by name.
+    select_within_budget: Keep the best documents that fit in a token budget.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import re
+import math
+from collections import Counter
+from typing import Callable, Literal
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.utils import count_tokens, format_docs
+
+Reranker = Callable[[str, list[Document]], list[Document]]
+
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lowercase terms.
+
+    Identifiers are kept whole and also split into their parts, so `ChatDeepSeek`
+    matches both `chatdeepseek` and `deepseek`, and `recursive_url` matches `url`.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        parts = [part.lower() for chunk in word.split("_") for part in _CAMEL.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def bm25_scores(
+    query: str, texts: list[str], k1: float = 1.5, b: float = 0.75
+) -> list[float]:
+    """Score the texts against the query with BM25, the idf is computed over the texts."""
+    query_terms = set(tokenize(query))
+    if not texts or not query_terms:
+        return [0.0] * len(texts)
+
+    term_freqs = []
+    lengths = []
+    doc_freqs: Counter[str] = Counter()
+    for text in texts:
+        terms = tokenize(text)
+        lengths.append(len(terms))
+        freqs = Counter(term for term in terms if term in query_terms)
+        term_freqs.append(freqs)
+        doc_freqs.update(freqs.keys())
+
+    n = len(texts)
+    avg_length = sum(lengths) / n or 1
+    idf = {
+        term: math.log(1 + (n - doc_freqs[term] + 0.5) / (doc_freqs[term] + 0.5))
+        for term in doc_freqs
+    }
+    scores = []
+    for freqs, length in zip(term_freqs, lengths):
+        norm = k1 * (1 - b + b * length / avg_length)
+        scores.append(
+            sum(idf[term] * freq * (k1 + 1) / (freq + norm) for term, freq in freqs.items())
+        )
+    return scores
+
+
+def bm25_rerank(query: str, documents: list[Document]) -> list[Document]:
+    """Rank the documents by their BM25 score against the query, ties keep the arrival order."""
+    scores = bm25_scores(query, [doc.page_content for doc in documents])
+    order = sorted(range(len(documents)), key=lambda i: -scores[i])
+    return [documents[i] for i in order]
+
+
+def no_rerank(query: str, documents: list[Document]) -> list[Document]:  # pylint: disable=unused-argument
+    """Keep the arrival order of the documents."""
+    return list(documents)
+
+
+RERANKERS: dict[str, Reranker] = {
+    "none": no_rerank,
+    "bm25": bm25_rerank,
+}
+
+
+def get_reranker(name: Literal["none", "bm25"]) -> Reranker:
+    """Get a reranker by name."""
+    try:
+        return RERANKERS[name]
+    except KeyError as e:
+        raise ValueError(f"Unsupported reranker: {name}") from e
+
+
+def select_within_budget(documents: list[Document], max_tokens: int) -> list[Document]:
+    """Keep the documents, in order, whose formatted size fits in the token budget.
+
+    A document larger than the remaining budget is skipped, so smaller documents
+    ranked after it can still fill the budget.
+    """
+    selected = []
+    remaining = max_tokens
+    for doc in documents:
+        tokens = count_tokens(format_docs([doc]))
+        if tokens <= remaining:
+            selected.append(doc)
+            remaining -= tokens
+    return selected
+
+
+if __name__ == "__main__":
+    test_docs = [
+        Document(page_content="Build a chatbot with LangGraph and memory."),
+        Document(page_content="ChatDeepSeek is a chat model integration for DeepSeek."),
+        Document(page_content="RecursiveUrlLoader loads all child links of a url."),
+    ]
+    for test_doc in bm25_rerank("How to use ChatDeepSeek?", test_docs):
+        print(test_doc.page_content)
+    print(len(select_within_budget(test_docs, 40)))
@@ -0,0 +1,129 @@
+"""
+Semantic response cache for the retrieval graph.
+
+Answers are stored in an internal Chroma collection, keyed by the embedding of the question.
+Each entry remembers the ingest version of the collections it was answered from, so the
+entry is dropped as soon as one of these collections is re-ingested.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import json
+import hashlib
+from typing import Any, Optional
+from pydantic import BaseModel, Field
+from chromadb.api.models.Collection import Collection
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.cache import LRUCache
+from src.configuration import Configuration
+from src.ingest.record_manager import get_ingest_version
+from src.vectorstore import get_vector_store_registry
+
+RESPONSE_CACHE_COLLECTION = "chat-with-x-response-cache"
+
+# reading the ingest version hits the record manager db, it only changes when ingesting
+_ingest_versions: LRUCache[str] = LRUCache(maxsize=256, ttl=60)
+
+
+class CachedResponse(BaseModel):
+    """A cached answer and the documents it was generated from."""
+
+    question: str = Field(description="The question that was answered.")
+    answer: str = Field(description="The cached answer.")
+    documents: list[Document] = Field(
+        default_factory=list, description="The documents the answer was generated from."
+    )
+    collections: list[str] = Field(
+        default_factory=list, description="The collections the documents were retrieved from."
+    )
+
+
+def _get_collection(configuration: Configuration) -> Collection:
+    """Get the internal collection storing the cached responses."""
+    client = get_vector_store_registry().get_client(
+        configuration.retriever_provider, configuration.storage_type
+    )
+    return client.get_or_create_collection(
+        RESPONSE_CACHE_COLLECTION,
+        metadata={"hnsw:space": "cosine", "internal": True},
+    )
+
+
+def _get_versions(collections: list[str], configuration: Configuration) -> dict[str, str]:
+    """Get the current ingest version of each collection."""
+    versions = {}
+    for collection_name in collections:
+        key = (configuration.retriever_provider, collection_name, configuration.embedding_model)
+        version = _ingest_versions.get(key)
+        if version is None:
+            version = get_ingest_version(*key)
+            _ingest_versions.set(key, version)
+        versions[collection_name] = version
+    return versions
+
+
+def _embed(question: str, configuration: Configuration) -> list[float]:
+    """Embed the question with the pooled embeddings model."""
+    embedding = get_vector_store_registry().get_embeddings(
+        configuration.embedding_model, **configuration.embedding_kwargs()
+    )
+    return embedding.embed_query(question)
+
+
+def lookup_response(question: str, configuration: Configuration) -> Optional[CachedResponse]:
+    """Look up the answer of a near-duplicate question, None if there is no valid one."""
+    collection = _get_collection(configuration)
+    if collection.count() == 0:
+        return None
+    result = collection.query(
+        query_embeddings=[_embed(question, configuration)],
+        n_results=1,
+        where={"embedding_model": configuration.embedding_model},
+        include=["metadatas", "distances"],
+    )
+    if not result["ids"][0]:
+        return None
+    entry_id = result["ids"][0][0]
+    metadata: dict[str, Any] = result["metadatas"][0][0]  # type: ignore
+    similarity = 1 - result["distances"][0][0]  # type: ignore
+    if similarity < configuration.response_cache_threshold:
+        return None
+
+    response = CachedResponse.model_validate_json(metadata["response"])
+    versions = json.loads(metadata["versions"])
+    if versions != _get_versions(response.collections, configuration):
+        # the collections have been re-ingested since the answer was cached
+        collection.delete(ids=[entry_id])
+        return None
+    return response
+
+
+def store_response(response: CachedResponse, configuration: Configuration):
+    """Store an answer in the cache, tagged with the ingest version of its collections."""
+    question = " ".join(response.question.split())
+    entry_id = hashlib.sha256(
+        f"{configuration.embedding_model}\0{question}".encode("utf-8")
+    ).hexdigest()
+    _get_collection(configuration).upsert(
+        ids=[entry_id],
+        embeddings=[_embed(response.question, configuration)],  # type: ignore
+        documents=[response.question],
+        metadatas=[
+            {
+                "embedding_model": configuration.embedding_model,
+                "response": response.model_dump_json(),
+                "versions": json.dumps(_get_versions(response.collections, configuration)),
+            }
+        ],
+    )
+
+
+def clear_responses(configuration: Configuration):
+    """Drop every cached response."""
+    client = get_vector_store_registry().get_client(
+        configuration.retriever_provider, configuration.storage_type
+    )
+    if RESPONSE_CACHE_COLLECTION in [c.name for c in client.list_collections()]:
+        client.delete_collection(RESPONSE_CACHE_COLLECTION)
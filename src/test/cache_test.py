@@ -0,0 +1,60 @@
+"""
+Eviction and expiry of the in-memory `LRUCache`.
+
+Run it with pytest.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.cache import LRUCache
+
+
+def test_least_recently_used_is_evicted():
+    """A full cache evicts the entry read or written the longest ago."""
+    cache: LRUCache[int] = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2, "hit_rate": 0.75}
+
+
+def test_overwrite_refreshes_the_entry():
+    """Setting a cached key again makes it the most recently used one."""
+    cache: LRUCache[int] = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 10)
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b", "missing") == "missing"
+    assert cache.get("a") == 10
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    """An entry older than the ttl is dropped when read."""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache: LRUCache[int] = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_zero_size_cache_stores_nothing():
+    """A cache of size 0 disables caching."""
+    cache: LRUCache[int] = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
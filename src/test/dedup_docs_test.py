@@ -0,0 +1,75 @@
+"""
+Deduplication of the retrieved chunks by `dedup_docs`.
+
+Run it with pytest.
+"""
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.ingest.splitter import get_text_splitter
+from src.utils import dedup_docs
+
+PAGE = "\n\n".join(
+    f"## Section {i}\n\n" + " ".join(f"word{i}_{j}" for j in range(60)) for i in range(6)
+)
+SOURCE = "https://example.com/page"
+
+
+def search(chunks: list[Document], positions: list[int], distances: list[float]):
+    """The hits of a query, copies of the chunks at `positions` with their distance."""
+    return [
+        Document(
+            page_content=chunks[i].page_content,
+            metadata={**chunks[i].metadata, "distance": distance},
+        )
+        for i, distance in zip(positions, distances)
+    ]
+
+
+@pytest.mark.parametrize("name", ["markdown", "recursive"])
+def test_overlapping_queries_collapse(name: str):
+    """The chunks found by two queries are kept once, with the smaller distance."""
+    chunks = get_text_splitter(name, chunk_size=100, chunk_overlap=10).create_documents(
+        [PAGE], [{"source": SOURCE}]
+    )
+    assert len(chunks) > 3
+    first = search(chunks, [0, 1, 2], [0.2, 0.5, 0.7])
+    second = search(chunks, [2, 1, 3], [0.3, 0.6, 0.4])
+    unique = dedup_docs(first + second)
+    assert [doc.page_content for doc in unique] == [
+        chunks[i].page_content for i in (0, 1, 2, 3)
+    ]
+    assert [doc.metadata["distance"] for doc in unique] == [0.2, 0.5, 0.3, 0.4]
+
+
+def test_same_offset_collapses():
+    """Chunks at the same offset of a page, or with the same text, are duplicates."""
+    docs = [
+        Document(page_content="Intro", metadata={"source": SOURCE, "start_index": 0}),
+        Document(
+            page_content="# Page\n\nIntro",
+            metadata={"source": SOURCE, "start_index": 0, "distance": 0.1},
+        ),
+        Document(page_content="Intro", metadata={"source": "https://example.com/other"}),
+    ]
+    unique = dedup_docs(docs)
+    assert unique == [docs[1]]
+
+
+def test_distance_kept_without_score():
+    """A duplicate without distance does not replace one with a distance."""
+    docs = [
+        Document(page_content="a", metadata={"distance": 0.4}),
+        Document(page_content="a"),
+        Document(page_content="b"),
+    ]
+    assert dedup_docs(docs) == [docs[0], docs[2]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
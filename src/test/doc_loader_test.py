@@ -0,0 +1,125 @@
+"""
+Conditional requests of the cached crawl, a `304 Not Modified` page keeps its cached entry.
+
+Run it with pytest.
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.ingest.crawl_cache import CrawlCache, CrawlEntry, hash_text
+from src.ingest.doc_loader import acached_recursive_url_crawl, afetch_page
+
+ROOT = "https://example.com/docs/"
+CHILD = "https://example.com/docs/child"
+
+
+class FakeResponse:
+    """The response of a fake session, an async context manager like aiohttp's."""
+
+    def __init__(self, status: int, text: str = "", headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._text = text
+
+    async def text(self) -> str:
+        return self._text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        return None
+
+
+class FakeSession:
+    """A session serving fixed pages, answering 304 to a request with a matching ETag."""
+
+    def __init__(self, pages: dict[str, tuple[str, str]]):
+        self.pages = pages
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+    def get(self, url: str, headers=None) -> FakeResponse:
+        headers = headers or {}
+        self.requests.append((url, headers))
+        if url not in self.pages:
+            return FakeResponse(404)
+        etag, text = self.pages[url]
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(304, headers={"ETag": etag})
+        return FakeResponse(200, text, {"ETag": etag})
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path):
+    """A crawl cache in a temporary database."""
+    with CrawlCache("test", str(tmp_path / "crawl.db")) as cache:
+        yield cache
+
+
+def test_not_modified_page_keeps_its_entry(cache):
+    """A cached page is fetched with its validators and a 304 keeps the cached entry."""
+    cached = CrawlEntry(
+        url=ROOT,
+        etag='"v1"',
+        last_modified="Mon, 01 Jan 2024 00:00:00 GMT",
+        html_hash="html",
+        content_hash="content",
+        links=[CHILD],
+        markdown="# Docs",
+    )
+    cache.put([cached])
+    session = FakeSession({ROOT: ('"v1"', "<html></html>")})
+    page = asyncio.run(afetch_page(ROOT, session, cache=cache))  # type: ignore
+    assert session.requests == [
+        (ROOT, {"If-None-Match": '"v1"', "If-Modified-Since": cached.last_modified})
+    ]
+    assert page is not None
+    assert page.status == "unchanged"
+    assert page.entry == cached
+    assert page.raw_doc is None
+
+
+def test_modified_page_is_refetched(cache):
+    """A page whose ETag changed is downloaded and extracted again."""
+    cache.put([CrawlEntry(url=ROOT, etag='"v1"', html_hash=hash_text("old"))])
+    session = FakeSession({ROOT: ('"v2"', "<html>new</html>")})
+    page = asyncio.run(afetch_page(ROOT, session, cache=cache))  # type: ignore
+    assert page is not None
+    assert page.status == "changed"
+    assert page.entry.etag == '"v2"'
+    assert page.raw_doc.page_content == "<html>new</html>"  # type: ignore
+
+
+def test_not_modified_without_cache_entry_fails():
+    """A 304 to an unconditional request is a failure."""
+    session = FakeSession({ROOT: ('"v1"', "")})
+    session.get = lambda url, headers=None: FakeResponse(304)  # type: ignore
+    with pytest.raises(ValueError):
+        asyncio.run(afetch_page(ROOT, session, raise_on_failure=True))  # type: ignore
+
+
+def test_crawl_follows_the_cached_links_of_a_not_modified_page(cache):
+    """The links of a 304 page come from the cache, its children are still crawled."""
+    cache.put([CrawlEntry(url=ROOT, etag='"v1"', links=[CHILD])])
+    session = FakeSession({ROOT: ('"v1"', ""), CHILD: ('"c1"', "<html>child</html>")})
+    pages = []
+
+    async def on_page(page):
+        pages.append(page)
+
+    asyncio.run(
+        acached_recursive_url_crawl(ROOT, session, on_page, cache=cache)  # type: ignore
+    )
+    assert [(page.entry.url, page.status) for page in pages] == [
+        (ROOT, "unchanged"),
+        (CHILD, "changed"),
+    ]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,95 @@
+"""
+Caching of the embeddings by `CachedEmbeddings` in its memory and sqlite tiers.
+
+Run it with pytest.
+"""
+import os
+import sys
+import asyncio
+import threading
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.embeddings import CachedEmbeddings, EmbeddingStore
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings that record the batches of texts they embed."""
+
+    batches: list[list[str]] = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.batches.append([text])
+        return super().embed_query(text)
+
+
+class ThreadRecordingStore(EmbeddingStore):
+    """An embedding store that records the threads it is read and written from."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.threads: list[int] = []
+
+    def mget(self, keys):
+        self.threads.append(threading.get_ident())
+        return super().mget(keys)
+
+    def mset(self, items):
+        self.threads.append(threading.get_ident())
+        return super().mset(items)
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    """A persistent embedding store in a temporary database."""
+    store = ThreadRecordingStore(str(tmp_path / "embeddings.db"))
+    yield store
+    store.close()
+
+
+def test_only_missing_texts_are_embedded():
+    """The cached texts are not embedded again, the missing ones are embedded once."""
+    model = RecordingEmbeddings(size=4, batches=[])
+    expected = DeterministicFakeEmbedding(size=4)
+    cached = CachedEmbeddings(model, "fake")
+    assert cached.embed_documents(["a", "b", "a"]) == expected.embed_documents(["a", "b", "a"])
+    assert cached.embed_documents(["b  ", "c"]) == expected.embed_documents(["b", "c"])
+    assert model.batches == [["a", "b"], ["c"]]
+    assert cached.stats()["memory_hits"] == 1
+
+
+def test_store_hit_after_memory_eviction(store):
+    """A text evicted from memory is read back from the store instead of embedded."""
+    model = RecordingEmbeddings(size=4, batches=[])
+    cached = CachedEmbeddings(model, "fake", cache_size=1, store=store)
+    vector = cached.embed_query("a")
+    cached.embed_query("b")
+    assert cached.embed_query("a") == vector
+    assert model.batches == [["a"], ["b"]]
+    assert cached.stats() == {"memory_hits": 0, "store_hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_async_store_io_runs_off_the_event_loop(store):
+    """The async methods read and write the sqlite store outside the event loop thread."""
+    cached = CachedEmbeddings(DeterministicFakeEmbedding(size=4), "fake", store=store)
+
+    async def embed() -> int:
+        await cached.aembed_documents(["a", "b"])
+        await cached.aembed_query("c")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(embed())
+    assert len(store.threads) == 4
+    assert loop_thread not in store.threads
+    assert store.mget([cached.key("a"), cached.key("c")])[1] is not None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,84 @@
+"""
+Bypass of the semantic response cache for the follow-up questions of a conversation.
+
+Run it with pytest.
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.agent import graph
+from src.agent.state import AgentState
+from src.response_cache import CachedResponse
+
+CONFIG = {"configurable": {"response_cache_enabled": True}}
+CACHED = CachedResponse(question="What is LangGraph?", answer="A graph library.")
+
+
+@pytest.fixture(name="response_cache")
+def fixture_response_cache(monkeypatch):
+    """A response cache answering every question, that records the lookups and stores."""
+    calls: dict[str, list] = {"lookups": [], "stores": []}
+
+    def lookup_response(question, _):
+        calls["lookups"].append(question)
+        return CACHED
+
+    def store_response(response, _):
+        calls["stores"].append(response)
+
+    monkeypatch.setattr(graph, "lookup_response", lookup_response)
+    monkeypatch.setattr(graph, "store_response", store_response)
+    return calls
+
+
+def single_turn() -> AgentState:
+    """A conversation with one question."""
+    return AgentState(messages=[HumanMessage(content="What is LangGraph?")])
+
+
+def multi_turn() -> AgentState:
+    """A conversation with a follow-up question."""
+    return AgentState(
+        messages=[
+            HumanMessage(content="What is LangGraph?"),
+            AIMessage(content="A graph library."),
+            HumanMessage(content="How do I install it?"),
+        ]
+    )
+
+
+def test_single_turn_question_is_answered_from_cache(response_cache):
+    """The only question of a conversation is looked up in the cache."""
+    command = asyncio.run(graph.check_response_cache(single_turn(), CONFIG))
+    assert response_cache["lookups"] == ["What is LangGraph?"]
+    assert command.goto.node == "respond_from_cache"  # type: ignore
+    assert command.goto.arg == CACHED  # type: ignore
+
+
+def test_follow_up_question_bypasses_cache(response_cache):
+    """A follow-up question is researched, not answered from the cache."""
+    command = asyncio.run(graph.check_response_cache(multi_turn(), CONFIG))
+    assert not response_cache["lookups"]
+    assert command.goto == "analyze_and_route_query"
+
+
+def test_follow_up_answer_is_not_cached(response_cache):
+    """Only the answer to a single-turn question is stored in the cache."""
+    documents = [Document(page_content="LangGraph docs")]
+    for state in (multi_turn(), single_turn()):
+        state.answer = "An answer."
+        state.documents = documents
+        state.question = state.messages[-1].content  # type: ignore
+        asyncio.run(graph.update_response_cache(state, CONFIG))
+    assert [response.question for response in response_cache["stores"]] == ["What is LangGraph?"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
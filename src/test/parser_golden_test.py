@@ -0,0 +1,114 @@
+"""
+Golden outputs of the site parsers, both extractor engines of a site must reproduce them.
+
+Run it with pytest, or directly to also benchmark the engines:
+    python src/test/parser_golden_test.py [--update]
+`--update` rewrites the golden markdown from the bs4 engines after a parser change.
+"""
+import os
+import sys
+import glob
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.ingest.parsers.langchain_recursive_url import langchain_recursive_url_page_extractor
+from src.ingest.parsers.langchain_recursive_url_lxml import (
+    langchain_recursive_url_lxml_page_extractor,
+)
+from src.ingest.parsers.langgraph_recursive_url import langgraph_recursive_url_page_extractor
+from src.ingest.parsers.langgraph_recursive_url_lxml import (
+    langgraph_recursive_url_lxml_page_extractor,
+)
+from src.ingest.parsers.langsmith_recursive_url import langsmith_recursive_url_page_extractor
+from src.ingest.parsers.langsmith_recursive_url_lxml import (
+    langsmith_recursive_url_lxml_page_extractor,
+)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+TEST_URLS = {
+    "langchain": "https://python.langchain.com/docs/golden/",
+    "langgraph": "https://langchain-ai.github.io/langgraph/golden/",
+    "langsmith": "https://docs.smith.langchain.com/golden/",
+}
+ENGINES = {
+    "langchain": {
+        "bs4": langchain_recursive_url_page_extractor,
+        "lxml": langchain_recursive_url_lxml_page_extractor,
+    },
+    "langgraph": {
+        "bs4": langgraph_recursive_url_page_extractor,
+        "lxml": langgraph_recursive_url_lxml_page_extractor,
+    },
+    "langsmith": {
+        "bs4": langsmith_recursive_url_page_extractor,
+        "lxml": langsmith_recursive_url_lxml_page_extractor,
+    },
+}
+
+
+def golden_pages(site: str):
+    """Yield the name, raw html and golden markdown of each page of the corpus of a site."""
+    for html_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, site, "*.html"))):
+        with open(html_path, encoding="utf-8") as f:
+            raw_html = f.read()
+        md_path = html_path[: -len(".html")] + ".md"
+        expected = None
+        if os.path.exists(md_path):
+            with open(md_path, encoding="utf-8") as f:
+                expected = f.read()
+        yield os.path.basename(html_path), raw_html, expected
+
+
+@pytest.mark.parametrize("site", ENGINES)
+def test_engines_match_golden(site: str):
+    """Both engines of a site produce the golden markdown and the same metadata."""
+    engines = ENGINES[site]
+    pages = list(golden_pages(site))
+    assert pages, site
+    for name, raw_html, expected in pages:
+        metadata, markdown = engines["bs4"](raw_html, TEST_URLS[site], doc_type="doc")
+        assert markdown == expected, name
+        assert engines["lxml"](raw_html, TEST_URLS[site], doc_type="doc") == (
+            metadata,
+            markdown,
+        ), name
+
+
+def update_golden():
+    """Rewrite the golden markdown from the bs4 engines."""
+    for site, engines in ENGINES.items():
+        for name, raw_html, _ in golden_pages(site):
+            _, markdown = engines["bs4"](raw_html, TEST_URLS[site])
+            md_path = os.path.join(GOLDEN_DIR, site, name[: -len(".html")] + ".md")
+            with open(md_path, "w", encoding="utf-8") as f:
+                f.write(markdown)
+
+
+def benchmark_engines(rounds: int = 50) -> dict[str, dict[str, float]]:
+    """Get the extraction time per page of each engine over the corpus of each site."""
+    timings: dict[str, dict[str, float]] = {}
+    for site, engines in ENGINES.items():
+        pages = [raw_html for _, raw_html, _ in golden_pages(site)]
+        timings[site] = {}
+        for engine, page_extractor in engines.items():
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for raw_html in pages:
+                    page_extractor(raw_html, TEST_URLS[site])
+            timings[site][engine] = (time.perf_counter() - start) / (rounds * len(pages))
+    return timings
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        update_golden()
+    for test_site in ENGINES:
+        test_engines_match_golden(test_site)
+    print("golden outputs match")
+    for test_site, site_timings in benchmark_engines().items():
+        for test_engine, seconds in site_timings.items():
+            print(f"{test_site} {test_engine}: {seconds * 1000:.2f}ms/page")
+        print(f"{test_site} speedup: {site_timings['bs4'] / site_timings['lxml']:.2f}x")
@@ -0,0 +1,68 @@
+"""
+Merging of the documents of the graph state by `reduce_docs`.
+
+Run it with pytest.
+"""
+import os
+import sys
+from typing import Annotated
+
+import pytest
+from langchain_core.documents import Document
+from langgraph.graph import END, START, StateGraph
+from pydantic import BaseModel, Field
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.utils import DocumentList, reduce_docs
+
+
+class State(BaseModel):
+    """A graph state with documents, like the agent and researcher states."""
+
+    documents: Annotated[list[Document], reduce_docs] = Field(default_factory=list)
+
+
+def test_graph_with_conditional_edge_adds_each_document_once():
+    """The documents written by a node reach the state once despite the conditional edge."""
+
+    def retrieve(_: State) -> dict:
+        return {"documents": [Document(page_content="first")]}
+
+    def retrieve_more(_: State) -> dict:
+        return {"documents": [Document(page_content="second")]}
+
+    def route(state: State) -> str:
+        return "retrieve_more" if len(state.documents) < 2 else END
+
+    builder = StateGraph(State)
+    builder.add_node(retrieve)
+    builder.add_node(retrieve_more)
+    builder.add_edge(START, "retrieve")
+    builder.add_conditional_edges("retrieve", route, ["retrieve_more", END])
+    builder.add_edge("retrieve_more", END)
+    result = builder.compile().invoke({"documents": []})
+    assert [doc.page_content for doc in result["documents"]] == ["first", "second"]
+
+
+def test_existing_documents_are_not_changed():
+    """Merging returns a new list, the existing one and its ids are left as they were."""
+    existing = reduce_docs(None, [Document(page_content="a", id="1")])
+    merged = reduce_docs(existing, [Document(page_content="b", id="2"), {"page_content": "c"}])
+    assert isinstance(merged, DocumentList)
+    assert [doc.page_content for doc in existing] == ["a"]
+    assert existing.ids == {"1"}
+    assert [doc.page_content for doc in merged] == ["a", "b", "c"]
+    assert merged[0] is existing[0]
+
+
+def test_known_ids_are_skipped():
+    """Documents with an id already in the state are not added again."""
+    docs = reduce_docs(None, [Document(page_content="a", id="1")])
+    docs = reduce_docs(docs, [Document(page_content="a again", id="1"), {"id": "1"}])
+    assert [doc.page_content for doc in docs] == ["a"]
+    assert reduce_docs(docs, "delete") == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
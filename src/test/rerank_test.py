@@ -0,0 +1,49 @@
+"""
+Selection of the reranked documents within the token budget of the response.
+
+Run it with pytest.
+"""
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.rerank import select_within_budget
+from src.utils import count_tokens, format_docs
+
+
+def doc(words: int, name: str) -> Document:
+    """A document of about `words` words."""
+    return Document(page_content=" ".join([name] * words), metadata={"source": name})
+
+
+def size(document: Document) -> int:
+    """The tokens a document takes in the response context."""
+    return count_tokens(format_docs([document]))
+
+
+def test_documents_kept_in_order_within_budget():
+    """The documents are kept in rank order while they fit."""
+    docs = [doc(20, "doc1"), doc(20, "doc2"), doc(20, "doc3")]
+    budget = size(docs[0]) + size(docs[1])
+    assert select_within_budget(docs, budget) == docs[:2]
+    assert select_within_budget(docs, budget - 1) == docs[:1]
+
+
+def test_large_document_is_skipped():
+    """A document over the remaining budget leaves room for the smaller ones after it."""
+    docs = [doc(10, "small"), doc(500, "large"), doc(10, "tiny")]
+    budget = size(docs[0]) + size(docs[2])
+    assert select_within_budget(docs, budget) == [docs[0], docs[2]]
+
+
+def test_empty_budget():
+    """Nothing fits in an empty budget."""
+    assert not select_within_budget([doc(5, "a")], 0)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
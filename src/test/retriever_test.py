@@ -0,0 +1,77 @@
+"""
+Fusion of the vector search results with the lexical index by `fuse_lexical`.
+
+Run it with pytest.
+"""
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.agent.researcher.tools import retriever
+from src.configuration import RetrieverConfig
+from src.lexical import LexicalIndex
+
+TEXTS = {
+    "a": "vector store persistence",
+    "b": "chat model streaming",
+    "c": "recursive url loader crawl",
+    "d": "recursive url loader depth crawl",
+}
+
+
+class FakeStore:
+    """The vector store of the collection, only fetches documents by id."""
+
+    def __init__(self):
+        self.fetched: list[str] = []
+
+    def get_by_ids(self, ids: list[str]) -> list[Document]:
+        self.fetched.extend(ids)
+        return [Document(id=doc_id, page_content=TEXTS[doc_id]) for doc_id in ids]
+
+
+@pytest.fixture(name="index")
+def fixture_index(monkeypatch):
+    """A lexical index of the collection, built in memory."""
+    index = LexicalIndex.build(list(TEXTS), list(TEXTS.values()), [{} for _ in TEXTS])
+    monkeypatch.setattr(retriever, "load_lexical_index", lambda *_: index)
+    return index
+
+
+def vector_results(*ids: str) -> list[Document]:
+    """The vector search results, in rank order."""
+    return [
+        Document(id=doc_id, page_content=TEXTS[doc_id], metadata={"distance": 0.1 * rank})
+        for rank, doc_id in enumerate(ids)
+    ]
+
+
+@pytest.mark.usefixtures("index")
+def test_documents_ranked_by_both_searches_come_first():
+    """The reciprocal rank fusion puts the documents found by both searches first."""
+    store = FakeStore()
+    documents = vector_results("a", "c", "b")
+    fused = retriever.fuse_lexical(
+        store, "docs", "recursive url crawl", documents, {"k": 3}, RetrieverConfig(rrf_k=60)
+    )
+    # c is 2nd by vector and 1st lexically, d 2nd lexically outranks b 3rd by vector
+    assert [doc.id for doc in fused] == ["c", "a", "d"]
+    assert fused[0] is documents[1]
+    assert store.fetched == ["d"]
+
+
+def test_vector_results_kept_without_lexical_index(monkeypatch):
+    """A collection without lexical index keeps the vector ranking."""
+    monkeypatch.setattr(retriever, "load_lexical_index", lambda *_: None)
+    documents = vector_results("a", "b")
+    assert retriever.fuse_lexical(
+        FakeStore(), "docs", "crawl", documents, {"k": 1}, RetrieverConfig()
+    ) is documents
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
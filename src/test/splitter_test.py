@@ -0,0 +1,149 @@
+"""
+Structure of the chunks of the markdown splitter.
+
+Run it with pytest.
+"""
+import os
+import sys
+import glob
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.ingest.splitter import MarkdownStructureSplitter, get_text_splitter, parse_blocks
+from src.utils import count_tokens
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden", "langchain")
+CHUNK_SIZE = 120
+
+
+def split(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = 10) -> list[str]:
+    """Split a text and check that every chunk fits in the chunk size."""
+    chunks = MarkdownStructureSplitter(chunk_size, chunk_overlap).split_text(text)
+    for chunk in chunks:
+        assert count_tokens(chunk) <= chunk_size, chunk
+    return chunks
+
+
+def code_block(num_lines: int, fence: str = "```python", closed: bool = True) -> str:
+    """A fenced code block of numbered lines."""
+    lines = [fence, *(f"value_{i} = compute({i})" for i in range(num_lines))]
+    return "\n".join(lines + ["```"] if closed else lines)
+
+
+def table(num_rows: int) -> str:
+    """A markdown table of numbered rows."""
+    rows = ["| Name | Description |", "| --- | --- |"]
+    return "\n".join(rows + [f"| param_{i} | The parameter number {i}. |" for i in range(num_rows)])
+
+
+def assert_fenced(chunk: str):
+    """Check that the code of a chunk is fenced and its fences are balanced."""
+    fences = [line for line in chunk.split("\n") if line.startswith("```")]
+    assert fences and len(fences) % 2 == 0, chunk
+    assert fences[0] == "```python", chunk
+
+
+def test_label_is_not_a_block():
+    """A label or a signature is kept as the prefix of the block it introduces."""
+    blocks = parse_blocks("Parameters:\n\n" + table(2) + "\n\nload(path) → Document\n\nText.")
+    assert [(block.kind, block.prefix) for block in blocks] == [
+        ("table", "Parameters:"),
+        ("text", "load(path) → Document"),
+    ]
+    assert blocks[0].text.startswith("| Name |")
+
+
+@pytest.mark.parametrize("label", ["", "Parameters:", "ChatModel.invoke(input) → Message"])
+def test_oversized_code_is_fenced_in_each_chunk(label: str):
+    """Each chunk of a code block too large for a chunk is fenced, the label stays first."""
+    text = f"# API\n\n{label}\n\n{code_block(200)}" if label else f"# API\n\n{code_block(200)}"
+    chunks = split(text)
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert_fenced(chunk)
+    if label:
+        assert label in chunks[0]
+        assert all(label not in chunk for chunk in chunks[1:])
+    code = "\n".join(
+        line for chunk in chunks for line in chunk.split("\n") if line.startswith("value_")
+    )
+    assert code.count("compute(") >= 200
+    assert "value_199 = compute(199)" in code
+
+
+def test_unclosed_fence_keeps_its_last_line():
+    """A code block without closing fence is closed in each chunk, its last line is code."""
+    chunks = split(code_block(200, closed=False))
+    for chunk in chunks:
+        assert_fenced(chunk)
+    assert "value_199 = compute(199)" in chunks[-1]
+
+
+@pytest.mark.parametrize("label", ["", "Parameters:"])
+def test_oversized_table_keeps_its_header(label: str):
+    """Each chunk of a table too large for a chunk starts with the table header."""
+    chunks = split(f"{label}\n\n{table(100)}" if label else table(100))
+    assert len(chunks) > 2
+    for chunk in chunks:
+        rows = chunk[chunk.index("| Name |") :].split("\n")
+        assert rows[:2] == ["| Name | Description |", "| --- | --- |"], chunk
+    rows = [row for chunk in chunks for row in chunk.split("\n") if row.startswith("| param_")]
+    assert len(set(rows)) == 100
+
+
+def test_large_label_is_split_on_its_own():
+    """A label too large to share a chunk with its block does not break the block."""
+    label = "Parameters " + " ".join(f"word{i}" for i in range(200)) + ":"
+    for chunk in split(f"{label}\n\n{code_block(200)}"):
+        if "value_" in chunk:
+            assert_fenced(chunk)
+
+
+def test_long_line_in_code_fits():
+    """A code line longer than a chunk is split and each part is fenced."""
+    chunks = split("\n".join(["```python", "x = " + "1 + " * 500 + "1", "```"]))
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert_fenced(chunk)
+
+
+def test_headings_metadata():
+    """The chunks carry the path of their headings."""
+    text = "# Guide\n\nIntro.\n\n## Install\n\n" + code_block(5) + "\n\n## Usage\n\nCall it."
+    docs = MarkdownStructureSplitter(chunk_size=40, chunk_overlap=0).create_documents([text])
+    assert [doc.metadata.get("headings") for doc in docs] == [
+        "Guide",
+        "Guide > Install",
+        "Guide > Usage",
+    ]
+
+
+@pytest.mark.parametrize("name", ["markdown", "recursive"])
+def test_start_index(name: str):
+    """The chunks record their offset in the page, the continued blocks at their first line."""
+    text = "# API\n\nParameters:\n\n" + code_block(200) + "\n\nText.\n\n" + table(100)
+    docs = get_text_splitter(name, chunk_size=CHUNK_SIZE, chunk_overlap=10).create_documents(
+        [text]
+    )
+    starts = [doc.metadata["start_index"] for doc in docs]
+    assert starts == sorted(set(starts)) and starts[0] == 0
+    for doc in docs:
+        # a continued code block or table starts with its repeated fence or header
+        lines = [line for line in doc.page_content.split("\n") if line.strip()][:3]
+        assert any(text.startswith(line, doc.metadata["start_index"]) for line in lines)
+
+
+def test_golden_pages():
+    """The golden pages are split into chunks that fit, with balanced fences."""
+    for path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))):
+        with open(path, encoding="utf-8") as f:
+            page = f.read()
+        for chunk in split(page, chunk_size=200, chunk_overlap=20):
+            fences = [line for line in chunk.split("\n") if line.lstrip().startswith("```")]
+            assert len(fences) % 2 == 0, (path, chunk)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,157 @@
+"""
+Batches and failures of the ingests streaming the crawled pages into the indexer.
+
+The pages are indexed while their source is crawled, and the crawl must not outlive a
+failed indexer.
+
+Run it with pytest.
+"""
+import os
+import sys
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src.configuration import IngestConfig
+from src.ingest import ingest
+from src.ingest.crawl_cache import CrawlCache, CrawlEntry
+from src.ingest.doc_loader import CrawledPage
+from src.ingest.registry import BASIC_SITE_PARSER, CrawlSource
+
+
+def patch_ingest(monkeypatch, tmp_path, crawl_fn, index_fn):
+    """Replace the crawl, the indexer and the stores of the ingest."""
+    monkeypatch.setattr(
+        ingest,
+        "get_ingest_target",
+        lambda *_: SimpleNamespace(
+            record_manager=SimpleNamespace(get_time=lambda: 0.0),
+            parent_store=None,
+            close=lambda: None,
+        ),
+    )
+    monkeypatch.setattr(
+        ingest, "CrawlCache", lambda name: CrawlCache(name, str(tmp_path / "crawl.db"))
+    )
+    monkeypatch.setattr(ingest, "acached_recursive_url_crawl", crawl_fn)
+    monkeypatch.setattr(ingest, "index_crawled_pages", index_fn)
+    monkeypatch.setattr(ingest, "finish_ingest", lambda *_, **__: None)
+
+
+def crawl_source(name: str) -> CrawlSource:
+    """A source crawled with the basic extractor."""
+    return CrawlSource(
+        name=name,
+        path=f"https://example.com/{name}/",
+        filter_urls=[],
+        meta_kwargs={},
+        max_depth=2,
+        page_extractor=next(iter(BASIC_SITE_PARSER.engines.values())),
+    )
+
+
+def test_pages_are_indexed_while_crawling(monkeypatch, tmp_path):
+    """Each source is indexed in batches as its pages arrive, not once crawled."""
+    crawled: dict[str, int] = {}
+    batches = []
+
+    async def crawl(path, on_page, **_):
+        for i in range(10):
+            await asyncio.sleep(0.01)
+            crawled[path] = i + 1
+            await on_page(CrawledPage("changed", CrawlEntry(url=f"{path}{i}")))
+
+    def index(batch, *_):
+        source = batch[0][0].entry.url.rsplit("/", 1)[0] + "/"
+        batches.append((source, len(batch), crawled[source]))
+        return {"num_added": len(batch)}
+
+    patch_ingest(monkeypatch, tmp_path, crawl, index)
+    sources = [crawl_source("a"), crawl_source("b")]
+    asyncio.run(ingest.aingest("test-collection", IngestConfig(ingest_batch_size=4), sources, None))
+    for source in sources:
+        sizes = [size for path, size, _ in batches if path == source.path]
+        assert sizes == [4, 4, 2]
+        # the first batch is indexed before the source has been crawled
+        assert min(count for path, _, count in batches if path == source.path) < 10
+
+
+def test_aingest_indexing_error_stops_the_crawls(monkeypatch, tmp_path):
+    """An indexer failing cancels the crawls of every source and raises its error."""
+    cancelled = []
+
+    async def endless_crawl(path, on_page, **_):
+        try:
+            i = 0
+            while True:
+                await asyncio.sleep(0)
+                i += 1
+                await on_page(CrawledPage("changed", CrawlEntry(url=f"{path}{i}")))
+        except asyncio.CancelledError:
+            cancelled.append(path)
+            raise
+
+    def failing_index(*_):
+        raise RuntimeError("indexing failed")
+
+    patch_ingest(monkeypatch, tmp_path, endless_crawl, failing_index)
+    sources = [crawl_source("a"), crawl_source("b")]
+    with pytest.raises(RuntimeError, match="indexing failed"):
+        asyncio.run(
+            asyncio.wait_for(
+                ingest.aingest(
+                    "test-collection", IngestConfig(ingest_batch_size=4), sources, None
+                ),
+                timeout=30,
+            )
+        )
+    assert sorted(cancelled) == [source.path for source in sources]
+
+
+def test_indexing_error_stops_the_crawl(monkeypatch, tmp_path):
+    """An indexer failing while the queue is full cancels the crawl and raises its error."""
+    crawl = {"pages": 0, "cancelled": False}
+
+    async def endless_crawl(on_page, **_):
+        try:
+            while True:
+                # like a request, each page lets the loop run
+                await asyncio.sleep(0)
+                crawl["pages"] += 1
+                await on_page(CrawledPage("changed", CrawlEntry(url=f"/{crawl['pages']}")))
+        except asyncio.CancelledError:
+            crawl["cancelled"] = True
+            raise
+
+    def failing_index(*_):
+        raise RuntimeError("indexing failed")
+
+    patch_ingest(monkeypatch, tmp_path, endless_crawl, failing_index)
+    source = crawl_source("documents")
+    errors = []
+
+    def run():
+        try:
+            ingest.stream_ingest(
+                "test-collection", IngestConfig(ingest_batch_size=4), [source], None
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            errors.append(e)
+
+    # the indexer fails on its first batch, the crawl has filled the queue by then
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "the streaming ingest hangs after an indexing error"
+    assert [str(e) for e in errors] == ["indexing failed"]
+    assert crawl["cancelled"]
+    # the batch, the full queue and the pages handed over while stopping
+    assert crawl["pages"] < 100
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
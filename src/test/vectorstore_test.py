@@ -0,0 +1,52 @@
+"""
+Pooling of the vector db clients, embeddings and vector stores by the registry.
+
+Run it with pytest.
+"""
+import os
+import sys
+
+import pytest
+from langchain_core.embeddings import FakeEmbeddings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from src import vectorstore
+from src.vectorstore import VectorStoreRegistry
+
+
+@pytest.fixture(name="registry")
+def fixture_registry(monkeypatch):
+    """A registry whose embeddings models are fake."""
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    monkeypatch.setattr(
+        vectorstore, "get_embeddings_model", lambda *_, **__: FakeEmbeddings(size=4)
+    )
+    registry = VectorStoreRegistry()
+    yield registry
+    registry.shutdown()
+
+
+def test_store_lookup_counts_once(registry, tmp_path):
+    """Each store lookup is one hit or one miss, the client and embeddings it builds are not."""
+    path = str(tmp_path)
+    store = registry.get_vector_store("chroma", "persistent", "docs", "openai/model", path)
+    assert registry.stats() == {"hits": 0, "misses": 1, "clients": 1, "embeddings": 1, "stores": 1}
+    assert registry.get_vector_store("chroma", "persistent", "docs", "openai/model", path) is store
+    registry.get_vector_store("chroma", "persistent", "code", "openai/model", path)
+    assert registry.stats() == {"hits": 1, "misses": 2, "clients": 1, "embeddings": 1, "stores": 2}
+
+
+def test_client_and_embeddings_lookups(registry, tmp_path):
+    """The client and embeddings asked for directly are counted, and shared with the stores."""
+    path = str(tmp_path)
+    client = registry.get_client("chroma", "persistent", path)
+    store = registry.get_vector_store("chroma", "persistent", "docs", "openai/model", path)
+    assert store._client is client  # pylint: disable=protected-access
+    assert registry.get_embeddings("openai/model") is store.embeddings
+    assert registry.stats()["hits"] == 1
+    assert registry.stats()["misses"] == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
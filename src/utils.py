@@ -1,17 +1,33 @@
 """Shared utility functions used in the project.
 
 Functions:
+    count_tokens: Count the tokens of a text.
     format_docs: Convert documents to an xml-formatted string.
+    dedup_docs: Drop documents with duplicated content.
     load_chat_model: Load a chat model from a model name.
+    load_structured_chat_model: Load a chat model bound to a structured output schema.
 """
+# pylint: disable=wrong-import-position
 import os
+import sys
 import uuid
+import hashlib
+from functools import lru_cache
 from typing import Any, Literal, Optional, Union
 
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
 from langchain_community.chat_models import ChatTongyi
+from pydantic import BaseModel
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+from src.cache import LRUCache
+
+# Chat models hold their own HTTP clients, reusing the instances reuses the connections.
+_chat_models: LRUCache[BaseChatModel] = LRUCache(maxsize=32)
+_structured_chat_models: LRUCache[Runnable] = LRUCache(maxsize=64)
 
 def get_record_db_url():
     """Get the URL of the record database."""
@@ -22,6 +38,44 @@ def get_record_db_url():
     return f"sqlite:///{db_path}"
 
 
+def get_metadata_path() -> str:
+    """Get the path of the metadata file describing the collections to ingest."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "../data/metadata.json")
+
+
+def get_crawl_cache_db_path() -> str:
+    """Get the path of the crawl cache database."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    db_dir = os.path.join(base_dir, "../data/crawlCache")
+    os.makedirs(db_dir, exist_ok=True)
+    return os.path.join(db_dir, "crawl_cache.db")
+
+
+def get_parent_store_db_path() -> str:
+    """Get the path of the parent document store database."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    db_dir = os.path.join(base_dir, "../data/parentStore")
+    os.makedirs(db_dir, exist_ok=True)
+    return os.path.join(db_dir, "parents.db")
+
+
+def get_embedding_cache_db_path() -> str:
+    """Get the path of the persistent embedding cache database."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    db_dir = os.path.join(base_dir, "../data/embeddingCache")
+    os.makedirs(db_dir, exist_ok=True)
+    return os.path.join(db_dir, "embeddings.db")
+
+
+def get_lexical_db_dir(provider: Literal["chroma", "supabase", "weaviate", "duck"]) -> str:
+    """Get the directory of the lexical indexes."""
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        f"../data/lexicalDB/{provider}",
+    )
+
+
 def get_vector_db_dir(provider: Literal["chroma", "supabase", "weaviate", "duck"]) -> str:
     """Get the directory of the vector database."""
     return os.path.join(
@@ -30,6 +84,25 @@ def get_vector_db_dir(provider: Literal["chroma", "supabase", "weaviate", "duck"
     )
 
 
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Get the tiktoken encoding, None if tiktoken or its encoding file is not available."""
+    try:
+        import tiktoken  # pylint: disable=import-outside-toplevel
+        # the encoding file is downloaded on first use
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # pylint: disable=broad-exception-caught
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text, estimated as 4 characters per token without tiktoken."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
 def _format_doc(doc: Document) -> str:
     """Format a single document as XML.
 
@@ -81,6 +154,69 @@ def format_docs(docs: Optional[list[Document]]) -> str:
 </documents>"""
 
 
+def _better(doc: Document, other: Document) -> bool:
+    """Check if a document has a better (lower) retrieval distance than another one."""
+    distance = doc.metadata.get("distance")
+    other_distance = other.metadata.get("distance")
+    if distance is None:
+        return False
+    return other_distance is None or distance < other_distance
+
+
+def dedup_docs(docs: list[Document]) -> list[Document]:
+    """Drop documents with the same content or the same (source, start_index) in O(n).
+
+    The position of the first occurrence is kept, filled with the duplicate that has the
+    lowest retrieval distance (`distance` in the metadata).
+
+    Args:
+        docs (list[Document]): The documents to deduplicate.
+
+    Returns:
+        list[Document]: The unique documents.
+    """
+    unique: list[Document] = []
+    positions: dict[Any, int] = {}
+    for doc in docs:
+        keys = [hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).digest()]
+        start_index = doc.metadata.get("start_index")
+        if start_index is not None:
+            keys.append((doc.metadata.get("source"), start_index))
+        position = next((positions[key] for key in keys if key in positions), None)
+        if position is None:
+            position = len(unique)
+            unique.append(doc)
+        elif _better(doc, unique[position]):
+            unique[position] = doc
+        for key in keys:
+            positions.setdefault(key, position)
+    return unique
+
+
+class DocumentList(list):
+    """List of documents with an index of their ids, used as the value of `reduce_docs`.
+
+    Keeping the index next to the list lets the reducer reuse the set of known ids
+    instead of rebuilding it from the documents on every merge.
+    """
+
+    def __init__(
+        self,
+        docs: Optional[list[Document]] = None,
+        ids: Optional[set[Optional[str]]] = None,
+    ):
+        super().__init__(docs or [])
+        self.ids: set[Optional[str]] = set(ids) if ids is not None else {doc.id for doc in self}
+
+    def add(self, doc: Document) -> bool:
+        """Append a document if its id is unknown, return whether it was appended."""
+        if doc.id in self.ids:
+            return False
+        self.append(doc)
+        self.ids.add(doc.id)
+        return True
+
+
 def reduce_docs(
     existing: Optional[list[Document]],
     new: Union[
@@ -91,50 +227,49 @@ def reduce_docs(
         Literal["delete"],
     ],
 ) -> list[Document]:
-    """Reduce and process documents based on the input type."""
+    """Reduce and process documents based on the input type.
+
+    The existing documents are never changed, LangGraph may still hold them in another
+    copy of the channels. When they are a `DocumentList`, the new list copies its
+    references and its set of ids instead of hashing every document id again.
+    """
     if new == "delete":
-        return []
+        return DocumentList()
 
-    existing_list: list[Document] = list[Document](existing) if existing else []
-    new_list: list[Document] = []
+    if isinstance(existing, DocumentList):
+        docs = DocumentList(existing, existing.ids)
+    else:
+        docs = DocumentList(existing)
     if isinstance(new, str):
-        new_list = [Document(page_content=new, id=str(uuid.uuid4()))]
+        docs.add(Document(page_content=new, id=str(uuid.uuid4())))
     elif isinstance(new, list):
-        existing_ids = set(doc.id for doc in existing_list)
         for item in new:
             if isinstance(item, str):
-                item_id = str(uuid.uuid4())
-                new_list.append(Document(page_content=item, id=item_id))
-                existing_ids.add(item_id)
+                docs.add(Document(page_content=item, id=str(uuid.uuid4())))
 
             elif isinstance(item, dict):
-                item_id = item.get("id", str(uuid.uuid4()))
-
-                if item_id not in existing_ids:
-                    new_list.append(Document(**item, id=item_id))
-                    existing_ids.add(item_id)
+                item_id = item.get("id") or str(uuid.uuid4())
+                if item_id not in docs.ids:
+                    docs.add(Document(**{**item, "id": item_id}))
 
             elif isinstance(item, Document):
-                item_id = item.id
-                if item_id is None:
-                    item_id = str(uuid.uuid4())
-                    new_item = item.model_copy(deep=True)
-                    new_item.id = item_id
-                else:
-                    new_item = item
+                if item.id is None:
+                    # a shallow copy is enough, only the id is set on the new document
+                    item = item.model_copy(update={"id": str(uuid.uuid4())})
+                docs.add(item)
 
-                if item_id not in existing_ids:
-                    new_list.append(new_item)
-                    existing_ids.add(item_id)
+    return docs
 
-    return existing_list + new_list
 
-
-def load_chat_model(fully_specified_name: str) -> tuple[BaseChatModel, str, str]:
+def load_chat_model(fully_specified_name: str, **kwargs) -> tuple[BaseChatModel, str, str]:
     """Load a chat model from a fully specified name.
 
+    Model instances are cached by (provider, name, kwargs), so the nodes of the graph
+    share one client per model instead of building a new one on every invocation.
+
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
+        **kwargs: Additional keyword arguments passed to the chat model.
     """
     if "/" in fully_specified_name:
         provider, name = fully_specified_name.split("/", maxsplit=1)
@@ -142,21 +277,87 @@ def load_chat_model(fully_specified_name: str) -> tuple[BaseChatModel, str, str]
         provider = ""
         name = fully_specified_name
 
+    key = (provider, name, *sorted(kwargs.items()))
+    model = _chat_models.get(key)
+    if model is None:
+        model = _init_chat_model(provider, name, **kwargs)
+        _chat_models.set(key, model)
+    return model, provider, name
+
+
+def _init_chat_model(provider: str, name: str, **kwargs) -> BaseChatModel:
+    """Create a new chat model instance."""
     if provider == "tongyi":
         # init_chat_model doesn't support tongyi
-        return ChatTongyi(name=name, api_key=None, model_kwargs={"temperature": 0}), provider, name
+        return ChatTongyi(
+            name=name, api_key=None, model_kwargs={"temperature": 0, **kwargs}
+        )
 
     model_kwargs = {}
     if provider == "google_genai":
         # google doesn't support system message
         model_kwargs["convert_system_message_to_human"] = True
-    return (
-        init_chat_model(name, model_provider=provider, temperature=0, **model_kwargs),
-        provider,
-        name,
+    return init_chat_model(
+        name, model_provider=provider, temperature=0, **model_kwargs, **kwargs
     )
 
 
+def load_structured_chat_model(
+    fully_specified_name: str, schema: type[BaseModel]
+) -> Runnable:
+    """Load a chat model whose output is parsed into the given schema.
+
+    The `with_structured_output` wrappers are cached by (model name, schema).
+
+    Args:
+        fully_specified_name (str): String in the format 'provider/model'.
+        schema (type[BaseModel]): The structured output schema.
+    """
+    key = (fully_specified_name, schema)
+    model = _structured_chat_models.get(key)
+    if model is None:
+        structured_output_kwargs = (
+            {"method": "function_calling"} if "openai" in fully_specified_name else {}
+        )
+        llm, _, _ = load_chat_model(fully_specified_name)
+        model = llm.with_structured_output(
+            schema, include_raw=False, **structured_output_kwargs
+        )
+        _structured_chat_models.set(key, model)
+    return model
+
+
+def clear_chat_model_cache():
+    """Drop every cached chat model and structured output wrapper."""
+    _chat_models.clear()
+    _structured_chat_models.clear()
+
+
+def _benchmark_reduce_docs(num_docs: int, batch_size: int = 10) -> tuple[float, float]:
+    """Time merging `num_docs` documents in batches, with the id index and rebuilding it."""
+    import time  # pylint: disable=import-outside-toplevel
+
+    batches = [
+        [Document(page_content=f"doc {i + j}", id=f"{i + j}") for j in range(batch_size)]
+        for i in range(0, num_docs, batch_size)
+    ]
+    timings = []
+    for copy in (False, True):
+        docs: list[Document] = []
+        start = time.perf_counter()
+        for batch in batches:
+            # a plain list input makes the reducer rebuild the set of ids
+            docs = reduce_docs(list(docs) if copy else docs, batch)
+        timings.append(time.perf_counter() - start)
+    return timings[0], timings[1]
+
+
 if __name__ == "__main__":
     print(get_record_db_url())
+    print(get_embedding_cache_db_path())
+    print(get_crawl_cache_db_path())
     print(get_vector_db_dir("chroma"))
+    print(get_lexical_db_dir("chroma"))
+    for n in (1_000, 4_000, 16_000):
+        indexed, rebuilt = _benchmark_reduce_docs(n)
+        print(f"reduce_docs {n:>6} docs: id index {indexed:.4f}s, rebuilt ids {rebuilt:.4f}s")
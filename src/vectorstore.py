@@ -4,15 +4,19 @@ Vector store for the retrieval graph.
 # pylint: disable=wrong-import-position
 import os
 import sys
-from typing import Literal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Optional
 import chromadb
 from chromadb.api import ClientAPI
+from chromadb.api.client import SharedSystemClient
 from langchain_chroma import Chroma
 from langchain_core.embeddings import Embeddings
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 from src.utils import get_vector_db_dir
+from src.embeddings import CachedEmbeddings, get_embeddings_model
 
 
 # Note 针对同步阻塞异步
@@ -20,12 +24,18 @@ from src.utils import get_vector_db_dir
 # 2. 快速修复：用 asyncio.to_thread() 包装同步函数
 # 3. Override（开发环境或过渡方案）
 #    比如调试时用`langgraph dev --allow-blocking` 或者设置环境变量``
+# Chroma 只有同步接口，检索时通过 VectorStoreRegistry.get_executor 的有界线程池执行（方案 2）
 
 def get_collection_list(provider: Literal["chroma", "duck", "weaviate", "supabase"]):
     """Get collection list from vector db client"""
     if provider == "chroma":
-        client: ClientAPI = chromadb.PersistentClient(path=get_vector_db_dir(provider))
-        return [collection.name for collection in client.list_collections()]
+        client = get_vector_store_registry().get_client(provider, "persistent")
+        return [
+            collection.name
+            for collection in client.list_collections()
+            # internal collections (e.g. the response cache) are not searchable sources
+            if not (collection.metadata or {}).get("internal")
+        ]
 
     if os.environ.get("LANGGRAPH_MODE") == "dev":
         return ["langchain"]
@@ -42,16 +52,172 @@ def get_vector_store(
     """Get vector store from vector db client"""
     path = get_vector_db_dir(provider)
     if provider == "chroma":
-        if storage_type == "persistent":
-            client: ClientAPI = chromadb.PersistentClient(path=path)
-        else:
-            raise ValueError(
-                f"We will add support for running chromadb in {storage_type} mode in the future"
-            )
         return Chroma(
-            client=client,
+            client=_make_client(provider, storage_type, path),
             collection_name=collection_name,
             embedding_function=embedding,
             **kwargs,
         )
     raise ValueError(f"We will add support for {provider} in the future")
+
+
+class VectorStoreRegistry:
+    """Process-wide pool of vector db clients, embedders and vector stores.
+
+    Building a `chromadb.PersistentClient` opens the SQLite/HNSW files and
+    building an `OpenAIEmbeddings` creates a new HTTP client, so doing it on
+    every retrieval is expensive. The registry hands out shared instances
+    keyed by (provider, storage_type, path, collection, embedding model).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: dict[tuple[str, str, str], ClientAPI] = {}
+        self._embeddings: dict[tuple, Embeddings] = {}
+        self._stores: dict[tuple, Chroma] = {}
+        self._executors: dict[int, ThreadPoolExecutor] = {}
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _record(self, hit: bool):
+        self._stats["hits" if hit else "misses"] += 1
+
+    def get_client(
+        self,
+        provider: Literal["chroma", "duck", "weaviate", "supabase"],
+        storage_type: Literal["persistent", "ephemeral", "cloud", "local"],
+        path: Optional[str] = None,
+    ) -> ClientAPI:
+        """Get a shared vector db client."""
+        with self._lock:
+            client, hit = self._get_client(provider, storage_type, path)
+            self._record(hit)
+            return client
+
+    def _get_client(
+        self,
+        provider: Literal["chroma", "duck", "weaviate", "supabase"],
+        storage_type: Literal["persistent", "ephemeral", "cloud", "local"],
+        path: Optional[str] = None,
+    ) -> tuple[ClientAPI, bool]:
+        """Get a shared vector db client and whether it was pooled, without counting it."""
+        path = path or get_vector_db_dir(provider)
+        key = (provider, storage_type, path)
+        client = self._clients.get(key)
+        if client is not None:
+            return client, True
+        client = _make_client(provider, storage_type, path)
+        self._clients[key] = client
+        return client, False
+
+    def get_embeddings(self, model: str, **kwargs) -> Embeddings:
+        """Get a shared embeddings model, kwargs are passed to `get_embeddings_model`."""
+        with self._lock:
+            embedding, hit = self._get_embeddings(model, **kwargs)
+            self._record(hit)
+            return embedding
+
+    def _get_embeddings(self, model: str, **kwargs) -> tuple[Embeddings, bool]:
+        """Get a shared embeddings model and whether it was pooled, without counting it."""
+        key = (model, *sorted(kwargs.items()))
+        embedding = self._embeddings.get(key)
+        if embedding is not None:
+            return embedding, True
+        embedding = get_embeddings_model(model, **kwargs)
+        self._embeddings[key] = embedding
+        return embedding, False
+
+    def get_vector_store(
+        self,
+        provider: Literal["chroma", "duck", "weaviate", "supabase"],
+        storage_type: Literal["persistent", "ephemeral", "cloud", "local"],
+        collection_name: str,
+        embedding_model: str,
+        path: Optional[str] = None,
+        **embedding_kwargs,
+    ) -> Chroma:
+        """Get a shared vector store for a collection, counted as one lookup in the stats."""
+        path = path or get_vector_db_dir(provider)
+        key = (
+            provider, storage_type, path, collection_name, embedding_model,
+            *sorted(embedding_kwargs.items()),
+        )
+        with self._lock:
+            store = self._stores.get(key)
+            self._record(store is not None)
+            if store is None:
+                client, _ = self._get_client(provider, storage_type, path)
+                embedding, _ = self._get_embeddings(embedding_model, **embedding_kwargs)
+                store = Chroma(
+                    client=client, collection_name=collection_name, embedding_function=embedding
+                )
+                self._stores[key] = store
+            return store
+
+    def get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """Get a shared bounded thread pool for the blocking vector db calls."""
+        with self._lock:
+            executor = self._executors.get(max_workers)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="vectorstore"
+                )
+                self._executors[max_workers] = executor
+            return executor
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit/miss counters and the number of pooled objects."""
+        with self._lock:
+            return {
+                **self._stats,
+                "clients": len(self._clients),
+                "embeddings": len(self._embeddings),
+                "stores": len(self._stores),
+            }
+
+    def shutdown(self):
+        """Drop every pooled object and release the underlying db systems."""
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            self._executors.clear()
+            self._stores.clear()
+            for embedding in self._embeddings.values():
+                if isinstance(embedding, CachedEmbeddings) and embedding.store is not None:
+                    embedding.store.close()
+            self._embeddings.clear()
+            if self._clients:
+                # PersistentClient keeps its system in a class level cache
+                SharedSystemClient.clear_system_cache()
+            self._clients.clear()
+            self._stats = {"hits": 0, "misses": 0}
+
+
+_registry = VectorStoreRegistry()
+
+
+def get_vector_store_registry() -> VectorStoreRegistry:
+    """Get the process-wide vector store registry."""
+    return _registry
+
+
+def _make_client(
+    provider: Literal["chroma", "duck", "weaviate", "supabase"],
+    storage_type: Literal["persistent", "ephemeral", "cloud", "local"],
+    path: str,
+) -> ClientAPI:
+    """Create a new vector db client."""
+    if provider == "chroma":
+        if storage_type == "persistent":
+            return chromadb.PersistentClient(path=path)
+        raise ValueError(
+            f"We will add support for running chromadb in {storage_type} mode in the future"
+        )
+    raise ValueError(f"We will add support for {provider} in the future")
+
+
+if __name__ == "__main__":
+    registry = get_vector_store_registry()
+    print(get_collection_list("chroma"))
+    print(get_collection_list("chroma"))
+    print(registry.stats())
+    registry.shutdown()